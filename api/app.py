@@ -1,5 +1,4 @@
 # Standard library
-import io
 import os
 import sys
 from pathlib import Path
@@ -22,7 +21,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response, FileResponse
 
 # Textbook
-from textbook import LazyTextbookReader, LLM, TextBookDatabase
+from textbook import LazyTextbookReader, LLM, TextBookDatabase, get_llm
 from textbook.database import ChapterInfo, BookInfo, SectionInfo, PageInfo
 
 # API models
@@ -118,7 +117,7 @@ async def lifespan(app: FastAPI):
 
     struct_logger = structlog.get_logger()
     
-    llm = LLM()
+    llm = get_llm()
     database = TextBookDatabase(db_path=db_path)
     database.__enter__()
     
@@ -234,12 +233,8 @@ async def get_page_image(request: PageImageRequest):
     try:
         pdf_path = get_pdf_path_from_book_id(request.book_id)
         with get_reader(pdf_path) as reader:
-            img = reader.get_page_as_image(request.page_number, request.dpi)
-            
-            # Convert PIL Image to base64
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format="PNG")
-            img_base64 = base64.b64encode(img_buffer.getvalue()).decode("utf-8")
+            img_data = reader.get_page_as_image_bytes(request.page_number, request.dpi, color=True)
+            img_base64 = base64.b64encode(img_data).decode("utf-8")
             
             return PageImageResponse(
                 book_id=request.book_id,
@@ -265,15 +260,10 @@ async def get_page_image_binary(
     try:
         pdf_path = get_pdf_path_from_book_id(book_id)
         with get_reader(pdf_path) as reader:
-            img = reader.get_page_as_image(page_number, dpi)
-            
-            # Convert PIL Image to bytes
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format="PNG")
-            img_buffer.seek(0)
+            img_data = reader.get_page_as_image_bytes(page_number, dpi, color=True)
             
             return Response(
-                content=img_buffer.getvalue(),
+                content=img_data,
                 media_type="image/png"
             )
     except HTTPException:
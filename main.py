@@ -2,7 +2,7 @@ import os
 import tomllib
 from warnings import warn
 
-from textbook import LazyTextbookReader, LLM, TextBookDatabase
+from textbook import LazyTextbookReader, TextBookDatabase, get_llm
 from pathlib import Path
 
 def load_config() -> dict:
@@ -22,13 +22,12 @@ def main():
     config = load_config()
     db_path = config.get("db_path", "textbook_context.db")
     
-    llm = LLM()
+    llm = get_llm()
     with TextBookDatabase(db_path=db_path) as context:
         with LazyTextbookReader(Path("tests/textbooks/topology_scan.pdf"), llm, context) as reader:
             reader.update_book_info()
             reader.update_toc()
             reader.update_alignment_offset(page_number=15)
-            # reader.interactive_alignment_offset()
             reader.check_alignment_offset()
 
 if __name__ == "__main__":
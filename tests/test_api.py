@@ -10,6 +10,8 @@ from io import BytesIO
 
 # Set dummy API key to avoid import errors
 os.environ.setdefault("LLM_GEMINI_KEY", "dummy_key_for_testing")
+# Skip the provider round-trip on LLM construction
+os.environ.setdefault("LLM_SKIP_HEALTH_CHECK", "1")
 
 from fastapi.testclient import TestClient
 
@@ -49,12 +51,19 @@ class TestAPIEndpoints:
         pytest.skip("No test PDF file found")
     
     @pytest.fixture
-    def client(self, temp_db, temp_uploads_dir):
+    def client(self, temp_db, temp_uploads_dir, tmp_path, monkeypatch):
         """Create a test client with mocked dependencies"""
         # Setup context and LLM before creating client
         from textbook.database import TextBookDatabase
         from textbook.model import LLM
+        import textbook.reader as reader_module
         import api.app as api
+
+        # Keep the LLM, embedding, page and TOC caches out of the home directory
+        monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm.sqlite"))
+        monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "embed.sqlite"))
+        monkeypatch.setenv("PAGE_CACHE_DIR", str(tmp_path / "pages"))
+        monkeypatch.setattr(reader_module, "TOC_CACHE_DIR", tmp_path / "toc")
         
         # Initialize context
         api.database = TextBookDatabase(db_path=temp_db)
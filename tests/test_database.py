@@ -368,4 +368,39 @@ class TestTextBookDatabase:
         
         retrieved = context.session.get(ChapterInfo, 1)
         assert retrieved.end_page_number is None
-        assert retrieved.summary is None
\ No newline at end of file
+        assert retrieved.summary is None
+    
+    def test_bulk_create_chapters_and_sections(self, database):
+        """Test creating a TOC in one call, duplicate titles are skipped"""
+        book = database.create_book("Topology", "Munkres", "topology", "topology", 500)
+        records = [
+            {
+                "title": "topological spaces", "index_string": "1", "start_page": 10, "end_page": 49,
+                "sections": [
+                    {"title": "open sets", "index_string": "1.1", "start_page": 10, "end_page": 29},
+                    {"title": "exercises", "index_string": "1.2", "start_page": 30, "end_page": 49},
+                ],
+            },
+            {
+                "title": "connectedness", "index_string": "2", "start_page": 50, "end_page": 99,
+                "sections": [
+                    {"title": "exercises", "index_string": "2.1", "start_page": 50, "end_page": 99},
+                ],
+            },
+            {"title": "connectedness", "index_string": "3", "start_page": 100, "end_page": 120, "sections": []},
+        ]
+
+        chapter_ids = database.bulk_create_chapters_and_sections(book.book_id, records)
+
+        chapters = database.get_chapters_by_book_id(book.book_id)
+        assert [chapter.chapter_id for chapter in chapters] == chapter_ids
+        assert [chapter.title for chapter in chapters] == ["topological spaces", "connectedness"]
+        sections = database.get_sections_by_book_id(book.book_id)
+        assert [section.title for section in sections] == ["open sets", "exercises"]
+        assert all(section.chapter_id == chapter_ids[0] for section in sections)
+        assert database.bulk_create_chapters_and_sections(book.book_id, records) == []
+        assert len(database.get_chapters_by_book_id(book.book_id)) == 2
+
+        replaced_ids = database.bulk_create_chapters_and_sections(book.book_id, records[1:], replace=True)
+        assert [chapter.chapter_id for chapter in database.get_chapters_by_book_id(book.book_id)] == replaced_ids
+        assert [section.title for section in database.get_sections_by_book_id(book.book_id)] == ["exercises"]
@@ -0,0 +1,242 @@
+"""
+Unit tests for LLMResponseCache, CachedEmbeddingModel and the shared cache helpers
+"""
+import os
+# Set dummy API key to avoid import errors (tests don't use LLM)
+os.environ.setdefault("LLM_GEMINI_KEY", "dummy_key_for_testing")
+
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from textbook.cache_utils import LRUCache, SQLiteStore
+from textbook.llm_cache import LLMResponseCache, CachedEmbeddingModel
+
+
+class FakeEmbeddingModel:
+    """Embeds text as a bag of lower-cased words over a small fixed vocabulary"""
+    VOCABULARY = ["summary", "page", "topology", "function", "chapter", "section"]
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, text: str) -> list[float]:
+        self.calls += 1
+        words = text.lower().split()
+        return [float(words.count(word)) for word in self.VOCABULARY]
+
+    def embed_multi(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        self.last_batch = list(texts)
+        return [self.embed(text) for text in texts]
+
+
+class TestLLMResponseCache:
+    """Test suite for LLMResponseCache class"""
+
+    @pytest.fixture
+    def cache_path(self):
+        """Create a temporary cache file path"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield Path(tmpdir) / "llm.sqlite"
+
+    def test_exact_hit(self, cache_path):
+        """Test that an identical prompt returns the stored response"""
+        cache = LLMResponseCache(db_path=cache_path)
+        assert cache.get("model", "prompt", "Schema") is None
+        cache.set("model", "prompt", "Schema", '{"a": 1}')
+        assert cache.get("model", "prompt", "Schema") == '{"a": 1}'
+        cache.close()
+
+    def test_key_includes_model_and_schema(self, cache_path):
+        """Test that responses are not shared across models or schemas"""
+        cache = LLMResponseCache(db_path=cache_path)
+        cache.set("model", "prompt", "Schema", "response")
+        assert cache.get("other-model", "prompt", "Schema") is None
+        assert cache.get("model", "prompt", "OtherSchema") is None
+        cache.close()
+
+    def test_persists_across_instances(self, cache_path):
+        """Test that the exact tier survives reopening the cache file"""
+        cache = LLMResponseCache(db_path=cache_path)
+        cache.set("model", "prompt", "Schema", "response")
+        cache.close()
+
+        reopened = LLMResponseCache(db_path=cache_path)
+        assert reopened.get("model", "prompt", "Schema") == "response"
+        reopened.close()
+
+    def test_attachment_content_changes_key(self, cache_path):
+        """Test that prompts with different attachments do not collide"""
+        from llm import Attachment
+
+        cache = LLMResponseCache(db_path=cache_path)
+        first = Attachment(content=b"image-1", type="image/png")
+        second = Attachment(content=b"image-2", type="image/png")
+        cache.set("model", "prompt", "Schema", "response", attachments=[first])
+        assert cache.get("model", "prompt", "Schema", attachments=[first]) == "response"
+        assert cache.get("model", "prompt", "Schema", attachments=[second]) is None
+        assert cache.get("model", "prompt", "Schema") is None
+        cache.close()
+
+    def test_schema_cache_name_tracks_fields(self):
+        """Test that changing a schema's fields changes its cache name"""
+        from pydantic import create_model
+        from textbook.llm_cache import schema_cache_name
+
+        first = schema_cache_name(create_model("Schema", title=(str, ...)))
+        second = schema_cache_name(create_model("Schema", title=(str, ...), page_number=(int, ...)))
+        assert first.startswith("Schema:")
+        assert second.startswith("Schema:") and second != first
+
+    def test_stale_entry_prompts_model_again(self, cache_path):
+        """Test that a cached response failing validation is treated as a miss and overwritten"""
+        import structlog
+        from pydantic import BaseModel
+        from textbook.llm_cache import schema_cache_name
+        from textbook.model import LLM
+
+        class Schema(BaseModel):
+            title: str
+
+        class FakeResponse:
+            def text(self):
+                return '{"title": "fresh"}'
+
+        class FakeModel:
+            calls = 0
+            def prompt(self, prompt, schema):
+                FakeModel.calls += 1
+                return FakeResponse()
+
+        llm = LLM.__new__(LLM)
+        llm.logger = structlog.get_logger("test")
+        llm.model_tiers = {"accurate": ("model", FakeModel())}  # type: ignore[assignment]
+        llm.cache = LLMResponseCache(db_path=cache_path)
+        llm.cache.set("model", "prompt", schema_cache_name(Schema), '{"name": "stale"}')
+
+        assert llm.prompt_with_schema("prompt", Schema).title == "fresh"
+        assert llm.prompt_with_schema("prompt", Schema).title == "fresh"
+        assert FakeModel.calls == 1
+        llm.cache.close()
+
+    def test_semantic_hit(self, cache_path):
+        """Test that a near-duplicate prompt hits the semantic tier"""
+        embedding_model = FakeEmbeddingModel()
+        cache = LLMResponseCache(db_path=cache_path, embedding_model=embedding_model)
+        cache.set("model", "summary of topology page", "Schema", "response")
+        assert cache.get("model", "Summary of  topology page", "Schema") == "response"
+        assert cache.get("model", "summary of topology page", "OtherSchema") is None
+        assert cache.get("model", "function chapter section", "Schema") is None
+        cache.close()
+
+    def test_semantic_disabled_without_embedding_model(self, cache_path):
+        """Test that only exact matches hit when no embedding model is given"""
+        cache = LLMResponseCache(db_path=cache_path)
+        cache.set("model", "summary of topology page", "Schema", "response")
+        assert cache.get("model", "Summary of  topology page", "Schema") is None
+        cache.close()
+
+
+class TestCachedEmbeddingModel:
+    """Test suite for CachedEmbeddingModel class"""
+
+    @pytest.fixture
+    def cache_path(self):
+        """Create a temporary cache file path"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield Path(tmpdir) / "embed.sqlite"
+
+    def test_only_misses_reach_provider(self, cache_path):
+        """Test that cached texts are not re-embedded and order is preserved"""
+        inner = FakeEmbeddingModel()
+        model = CachedEmbeddingModel(inner, "fake", db_path=cache_path)
+        first = model.embed_batch(["topology page", "function"])
+        second = model.embed_batch(["function", "chapter", "topology page", "chapter"])
+
+        assert inner.last_batch == ["chapter"]
+        assert second[0] == first[1]
+        assert second[2] == first[0]
+        assert second[1] == second[3] == inner.embed("chapter")
+        model.close()
+
+    def test_persistent_backing(self, cache_path):
+        """Test that embeddings evicted from memory are served from SQLite"""
+        inner = FakeEmbeddingModel()
+        model = CachedEmbeddingModel(inner, "fake", db_path=cache_path, capacity=1)
+        model.embed_batch(["topology", "function"])
+        calls = inner.calls
+        assert model.embed("topology") == inner.embed("topology")
+        assert inner.calls == calls + 1  # only the direct inner.embed call above
+        model.close()
+
+        reopened = CachedEmbeddingModel(FakeEmbeddingModel(), "fake", db_path=cache_path)
+        assert reopened.embed("function") == [0.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+        assert reopened.inner.calls == 0
+        reopened.close()
+
+    def test_store_opened_lazily(self, cache_path):
+        """Test that no SQLite file is created until something is embedded"""
+        model = CachedEmbeddingModel(FakeEmbeddingModel(), "fake", db_path=cache_path)
+        assert not cache_path.exists()
+        model.embed("topology")
+        assert cache_path.exists()
+        model.close()
+
+    def test_memory_and_disk_hits_agree(self, cache_path):
+        """Test that a vector served from SQLite equals the one returned before eviction"""
+        class FractionalEmbeddingModel:
+            def embed_multi(self, texts):
+                return [[0.1, 1 / 3] for _ in texts]
+
+        model = CachedEmbeddingModel(FractionalEmbeddingModel(), "fake", db_path=cache_path, capacity=1)
+        first = model.embed("topology")
+        model.embed("function")  # evicts "topology" from memory
+        assert model.embed("topology") == first
+        model.close()
+
+    def test_env_switches(self, cache_path, monkeypatch):
+        """Test that EMBEDDING_CACHE_* env variables disable or relocate the cache"""
+        from textbook.llm_cache import create_embedding_cache
+
+        inner = FakeEmbeddingModel()
+        monkeypatch.setenv("EMBEDDING_CACHE_DISABLED", "1")
+        assert create_embedding_cache(inner, "fake") is inner
+
+        monkeypatch.delenv("EMBEDDING_CACHE_DISABLED")
+        monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(cache_path))
+        model = create_embedding_cache(inner, "fake")
+        assert model.db_path == cache_path
+        model.close()
+
+    def test_forwards_attributes(self, cache_path):
+        """Test that unknown attributes resolve on the wrapped model"""
+        inner = FakeEmbeddingModel()
+        model = CachedEmbeddingModel(inner, "fake", db_path=cache_path)
+        assert model.VOCABULARY is inner.VOCABULARY
+        model.close()
+
+
+class TestCacheUtils:
+    """Test suite for the helpers shared by every cache"""
+
+    def test_lru_evicts_least_recently_used(self):
+        """Reading an entry protects it from the next eviction"""
+        cache: LRUCache[str, int] = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_store_opened_lazily(self, tmp_path):
+        """The SQLite file and its directory appear on first connect only"""
+        store = SQLiteStore(tmp_path / "nested" / "cache.sqlite", "CREATE TABLE IF NOT EXISTS item (key TEXT PRIMARY KEY)")
+        assert not store.db_path.parent.exists()
+        with store.lock:
+            store.connect().execute("INSERT INTO item (key) VALUES ('a')")
+        assert store.db_path.exists()
+        store.close()
@@ -4,7 +4,7 @@ import shutil
 from pathlib import Path
 
 # Set dummy API key to avoid import errors (tests don't use LLM for actual calls)
-# os.environ.setdefault("LLM_GEMINI_KEY", "dummy_key_for_testing")
+os.environ.setdefault("LLM_GEMINI_KEY", "dummy_key_for_testing")
 
 from textbook.reader import LazyTextbookReader
 from textbook.database import TextBookDatabase
@@ -64,4 +64,356 @@ class TestLazyTextbookReader:
 
             print("page: ", page.summary)
 
-        
\ No newline at end of file
+        
+
+TOC_PAGE_TEXT = "Contents\n" + "\n".join(f"{i} Chapter {i} {10 * i}" for i in range(1, 25)) + "\nPreface ix\nIndex 300"
+
+
+class FakeLLM:
+    """Returns a fixed TOC and records the prompts it receives"""
+
+    def __init__(self):
+        self.calls = []
+        self.model_tiers = []
+
+    def prompt_with_schema_and_attachments(self, prompt, schema, attachments, schema_json=None, model_tier="accurate"):
+        self.calls.append((prompt, attachments))
+        self.model_tiers.append(model_tier)
+        return schema.model_validate({
+            "chapters": [
+                {"index_string": "1", "title": "chapter 1", "page_number": 10, "sections": []},
+                {"index_string": "2", "title": "chapter 2", "page_number": 20, "sections": []},
+            ]
+        })
+
+    def prompt_with_schema(self, prompt, schema, schema_json=None, model_tier="accurate"):
+        self.calls.append((prompt, []))
+        self.model_tiers.append(model_tier)
+        page_number = prompt.split("Page ")[-1].split(".")[0]
+        return schema.model_validate({
+            "page_summary": [{"title": f"page {page_number}", "summary": "the concept of function"}],
+            "has_exercises": False,
+        })
+
+
+class TestLazyTextbookReaderGenerated:
+    """Test suite for LazyTextbookReader on PDFs generated on the fly"""
+
+    @pytest.fixture
+    def database(self, tmp_path):
+        """Create a TextBookDatabase instance with temporary database"""
+        database = TextBookDatabase(db_path=str(tmp_path / "test.db"))
+        yield database
+        database.close()
+
+    @pytest.fixture
+    def born_digital_pdf(self, tmp_path) -> Path:
+        """Create a PDF with a text layer and a blank page"""
+        import pymupdf
+        document = pymupdf.open()
+        for page_number in range(6):
+            page = document.new_page()
+            if page_number != 3:
+                page.insert_textbox(pymupdf.Rect(72, 72, 540, 720), f"Page {page_number}. " + "The concept of function. " * 20)
+        pdf_path = tmp_path / "born_digital.pdf"
+        document.save(pdf_path)
+        document.close()
+        return pdf_path
+
+    @pytest.fixture
+    def toc_pdf(self, tmp_path) -> Path:
+        """Create a PDF whose pages 2 and 3 are a table of contents"""
+        import pymupdf
+        document = pymupdf.open()
+        for page_number in range(30):
+            page = document.new_page()
+            text = TOC_PAGE_TEXT if page_number in (2, 3) else f"Page {page_number}. " + "The concept of function. " * 20
+            page.insert_textbox(pymupdf.Rect(72, 72, 540, 760), text, fontsize=9)
+        pdf_path = tmp_path / "toc.pdf"
+        document.save(pdf_path)
+        document.close()
+        return pdf_path
+
+    @pytest.fixture
+    def scanned_pdf(self, tmp_path):
+        """Create a PDF of blank pages, standing in for a scan without a text layer, with the given page count"""
+        import pymupdf
+
+        def create(number_of_pages: int) -> Path:
+            document = pymupdf.open()
+            for _ in range(number_of_pages):
+                document.new_page()
+            pdf_path = tmp_path / "scanned.pdf"
+            document.save(pdf_path)
+            document.close()
+            return pdf_path
+        return create
+
+    @pytest.fixture
+    def fake_mineru(self, monkeypatch) -> list:
+        """Answer MinerU requests with "ocr of <file name>" and return the file names uploaded by each request"""
+        from textbook.mineru import MinerURequest
+        uploads = []
+        def fake_request(request):
+            uploads.append([file_name for file_name, _ in request.files])
+            return {file_name.rsplit(".", 1)[0]: {"md_content": f"ocr of {file_name}"} for file_name, _ in request.files}
+        monkeypatch.setattr(MinerURequest, "request", fake_request)
+        return uploads
+
+    def test_update_toc(self, toc_pdf, database, tmp_path, monkeypatch):
+        """Test that the TOC pages are located, sent to the LLM and saved"""
+        import textbook.reader as reader_module
+        monkeypatch.setattr(reader_module, "TOC_CACHE_DIR", tmp_path / "toc_cache")
+
+        llm = FakeLLM()
+        with LazyTextbookReader(toc_pdf, llm, database) as reader:  # type: ignore[arg-type]
+            rendered_pages = []
+            render = reader.get_page_as_image_bytes
+            monkeypatch.setattr(reader, "get_page_as_image_bytes", lambda page_number, *args, **kwargs: rendered_pages.append(page_number) or render(page_number, *args, **kwargs))
+            book = database.create_book("book", "author", "keywords", reader.pdf_name, reader.get_total_pages())
+            reader.book_info = book
+            reader.update_toc()
+            assert sorted(rendered_pages) == [2, 3, 4]  # only the pages attached to the prompt are rendered
+
+            prompt, attachments = llm.calls[0]
+            assert "chapter 24" in prompt.lower()
+            assert llm.model_tiers == ["accurate"]
+            assert len(attachments) == 3  # both TOC pages and the page following them
+            assert all(attachment.content.startswith(b"\x89PNG") and attachment.path is None for attachment in attachments)
+            assert database.get_book_toc_end_page(book.book_id, default_value=-1) == 4
+            assert [chapter.title for chapter in database.get_chapters_by_book_id(book.book_id)] == ["chapter 1", "chapter 2"]
+
+            # A second extraction of the same TOC is served from the cache
+            reader.update_toc(overwrite=True)
+            assert len(llm.calls) == 1
+            assert len(rendered_pages) == 3
+            assert len(database.get_chapters_by_book_id(book.book_id)) == 2
+
+            # A cached TOC that no longer validates is extracted again instead of failing
+            (cache_file,) = (tmp_path / "toc_cache").iterdir()
+            cache_file.write_text('{"chapters": [{"title": "missing fields"}]}')
+            reader.update_toc(overwrite=True)
+            assert len(llm.calls) == 2
+            assert len(database.get_chapters_by_book_id(book.book_id)) == 2
+
+    def test_summarize_pages(self, born_digital_pdf, database, monkeypatch):
+        """Test that pages summarized concurrently are saved in batches"""
+        import asyncio
+        import threading
+        import textbook.reader as reader_module
+        monkeypatch.setattr(reader_module, "PAGE_SUMMARY_SAVE_BATCH_SIZE", 2)
+
+        llm = FakeLLM()
+        with LazyTextbookReader(born_digital_pdf, llm, database) as reader:  # type: ignore[arg-type]
+            reader.book_info = database.create_book("book", "author", "keywords", reader.pdf_name, reader.get_total_pages())
+            # Summaries are prompted from the page text alone, no chapter or section lookups
+            monkeypatch.setattr(database, "get_chapters_by_book_id", None)
+            monkeypatch.setattr(database, "get_chapters_by_book_id_and_page_range", None)
+            writer_threads = set()
+            bulk_create_page_info = database.bulk_create_page_info
+            def record_writer(book_id, batch):
+                writer_threads.add(threading.get_ident())
+                assert 0 < len(batch) <= 2
+                return bulk_create_page_info(book_id, batch)
+            monkeypatch.setattr(database, "bulk_create_page_info", record_writer)
+            page_ids = asyncio.run(reader.summarize_pages([0, 1, 2, 4, 5], concurrency=3))
+            assert len(writer_threads) == 1
+            assert llm.model_tiers == ["fast"] * 5
+
+            assert sorted(page_ids) == [0, 1, 2, 4, 5]
+            for page_number, page_id in page_ids.items():
+                page = database.get_page_info(page_id)
+                assert page is not None
+                assert page.page_number == page_number
+                assert page.summary == f"page {page_number}: the concept of function"
+
+    def test_summarize_pages_honours_concurrency(self, born_digital_pdf, database, monkeypatch):
+        """Test that as many LLM requests as asked for are in flight, independent of the default executor size"""
+        import asyncio
+        import threading
+        import time
+
+        llm = FakeLLM()
+        in_flight, peak = [0], [0]
+        lock = threading.Lock()
+        prompt_with_schema = llm.prompt_with_schema
+        def slow_prompt(*args, **kwargs):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.2)
+            with lock:
+                in_flight[0] -= 1
+            return prompt_with_schema(*args, **kwargs)
+        monkeypatch.setattr(llm, "prompt_with_schema", slow_prompt)
+
+        with LazyTextbookReader(born_digital_pdf, llm, database) as reader:  # type: ignore[arg-type]
+            reader.book_info = database.create_book("book", "author", "keywords", reader.pdf_name, reader.get_total_pages())
+            asyncio.run(reader.summarize_pages(list(range(6)) * 2, concurrency=12))
+        assert peak[0] == 12
+
+    def test_summarize_pages_saves_finished_summaries_on_failure(self, born_digital_pdf, database, monkeypatch):
+        """Test that summaries finishing after another page failed are still written"""
+        import asyncio
+        import threading
+        import time
+
+        llm = FakeLLM()
+        prompt_with_schema = llm.prompt_with_schema
+        all_started = threading.Barrier(3)
+        def failing_prompt(prompt, *args, **kwargs):
+            all_started.wait(timeout=5)
+            if "Page 0." in prompt:
+                raise RuntimeError("LLM request failed")
+            time.sleep(0.1)  # still running when page 0 fails
+            return prompt_with_schema(prompt, *args, **kwargs)
+        monkeypatch.setattr(llm, "prompt_with_schema", failing_prompt)
+
+        saved_pages = []
+        bulk_create_page_info = database.bulk_create_page_info
+        def record_saved(book_id, batch):
+            saved_pages.extend(page_number for page_number, _ in batch)
+            return bulk_create_page_info(book_id, batch)
+        monkeypatch.setattr(database, "bulk_create_page_info", record_saved)
+
+        with LazyTextbookReader(born_digital_pdf, llm, database) as reader:  # type: ignore[arg-type]
+            reader.book_info = database.create_book("book", "author", "keywords", reader.pdf_name, reader.get_total_pages())
+            with pytest.raises(RuntimeError):
+                asyncio.run(reader.summarize_pages([0, 1, 2], concurrency=3))
+            assert sorted(saved_pages) == [1, 2]
+
+    def test_ocr_results_are_cached(self, tmp_path, scanned_pdf, fake_mineru, database, monkeypatch):
+        """Test that OCR text is reused within a reader and persisted across readers"""
+        monkeypatch.setenv("PAGE_CACHE_DIR", str(tmp_path / "pages"))
+        pdf_path = scanned_pdf(3)
+
+        with LazyTextbookReader(pdf_path, None, database) as reader:  # type: ignore[arg-type]
+            assert reader.get_page_content(1) == "ocr of scanned_page_1.jpg"
+            assert reader.get_page_content_with_image(1)[0] == "ocr of scanned_page_1.jpg"
+            assert fake_mineru == [["scanned_page_1.jpg"]]
+
+        with LazyTextbookReader(pdf_path, None, database) as reader:  # type: ignore[arg-type]
+            assert reader.get_page_content(1) == "ocr of scanned_page_1.jpg"
+            assert len(fake_mineru) == 1
+
+    def test_ocr_pages_in_one_batch(self, scanned_pdf, fake_mineru, database, monkeypatch):
+        """Test that pages needing OCR are sent to MinerU in a single request"""
+        monkeypatch.setenv("PAGE_CACHE_DISABLED", "1")
+
+        with LazyTextbookReader(scanned_pdf(4), None, database) as reader:  # type: ignore[arg-type]
+            texts = reader.get_pages_as_text_from_image([2, 0, 2])
+            assert texts == {2: "ocr of scanned_page_2.jpg", 0: "ocr of scanned_page_0.jpg"}
+            assert fake_mineru == [["scanned_page_2.jpg", "scanned_page_0.jpg"]]
+
+            assert reader.get_text_for_pages([3, 1, 0, 2]) == {i: f"ocr of scanned_page_{i}.jpg" for i in range(4)}
+            assert len(fake_mineru) == 2
+            assert [reader.get_page_content(page_number) for page_number in range(4)] == [f"ocr of scanned_page_{i}.jpg" for i in range(4)]
+            assert len(fake_mineru) == 2
+
+    def test_prefetch_front_matter(self, scanned_pdf, fake_mineru, database, monkeypatch):
+        """Test that the front matter is OCRed in one request and later reads hit the cache"""
+        monkeypatch.setenv("PAGE_CACHE_DISABLED", "1")
+
+        with LazyTextbookReader(scanned_pdf(4), None, database) as reader:  # type: ignore[arg-type]
+            reader.prefetch_front_matter(3)
+            assert fake_mineru == [["scanned_page_0.jpg", "scanned_page_1.jpg", "scanned_page_2.jpg"]]
+            assert reader.get_page_content_with_image(0)[0] == "ocr of scanned_page_0.jpg"
+            assert len(fake_mineru) == 1
+
+        with LazyTextbookReader(scanned_pdf(4), None, database, force_text_only_extraction=True) as reader:  # type: ignore[arg-type]
+            reader.prefetch_front_matter(3)
+            assert len(fake_mineru) == 1  # opted out of OCR, nothing uploaded
+
+    def test_blank_page_in_born_digital_pdf_skips_ocr(self, born_digital_pdf, database, monkeypatch):
+        """Test that a blank page of a PDF with a text layer is not sent to OCR"""
+        with LazyTextbookReader(born_digital_pdf, None, database) as reader:  # type: ignore[arg-type]
+            assert reader._has_text_layer
+            monkeypatch.setattr(reader, "get_page_as_text_from_image", lambda page_number: pytest.fail("OCR should not be called"))
+            assert reader.get_page_content(3) == ""
+            assert "the concept of function" in reader.get_page_content(0).lower()
+
+    def test_pages_read_from_worker_threads(self, born_digital_pdf, database, monkeypatch):
+        """Test that worker threads share the document and never run pymupdf at the same time"""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        with LazyTextbookReader(born_digital_pdf, None, database) as reader:  # type: ignore[arg-type]
+            expected = [reader.get_page_as_text(page_number) for page_number in range(6)]
+
+            active, overlaps = [], []
+            active_lock = threading.Lock()
+            page_type = type(reader.pdf_document[0])  # type: ignore[index]
+            get_text = page_type.get_text
+            def tracked_get_text(page, *args, **kwargs):
+                with active_lock:
+                    active.append(page.number)
+                    overlaps.append(len(active) > 1)
+                time.sleep(0.01)
+                with active_lock:
+                    active.remove(page.number)
+                return get_text(page, *args, **kwargs)
+            monkeypatch.setattr(page_type, "get_text", tracked_get_text)
+
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                texts = list(executor.map(reader.get_page_as_text, range(6)))
+            assert texts == expected
+            assert overlaps and not any(overlaps)
+
+    def test_get_pages_content_async(self, born_digital_pdf, database):
+        """Test that pages fetched concurrently come back in request order"""
+        import asyncio
+
+        with LazyTextbookReader(born_digital_pdf, None, database) as reader:  # type: ignore[arg-type]
+            expected = [reader.get_page_content(page_number) for page_number in (5, 0, 2)]
+            assert asyncio.run(reader.get_pages_content_async([5, 0, 2], concurrency=2)) == expected
+
+    def test_generate_block_with_range(self):
+        """Test that block ranges end one page before the next block and the input is left untouched"""
+        blocks = [{"title": "a", "page_number": 3}, {"title": "b", "page_number": 8}]
+        ranges = [(block["title"], start, end) for block, start, end in LazyTextbookReader.generate_block_with_range(blocks, 20)]
+        assert ranges == [("a", 3, 7), ("b", 8, 19)]
+        assert list(LazyTextbookReader.generate_block_with_range(blocks, 20))[-1][2] == 19
+        assert len(blocks) == 2
+
+    def test_page_renders_in_grayscale_unless_color(self, born_digital_pdf, database):
+        """Test that page images are grayscale by default and RGB when color is requested"""
+        with LazyTextbookReader(born_digital_pdf, None, database) as reader:  # type: ignore[arg-type]
+            assert reader.get_page_as_image(0, dpi=72).mode == "L"
+            assert reader.get_page_as_image(0, dpi=72, color=True).mode == "RGB"
+
+    def test_short_ocr_results_retried_at_higher_dpi(self, scanned_pdf, fake_mineru, database, monkeypatch):
+        """Test that pages with too little OCR text are re-rendered at OCR_RETRY_DPI once"""
+        import textbook.reader as reader_module
+        from textbook.reader import OCR_RETRY_DPI
+        # Every fake OCR result counts as too short
+        monkeypatch.setattr(reader_module, "MIN_PAGE_CONTENT_LENGTH", 100)
+
+        with LazyTextbookReader(scanned_pdf(2), None, database) as reader:  # type: ignore[arg-type]
+            rendered_dpis = []
+            render = reader.get_page_as_image_bytes
+            monkeypatch.setattr(reader, "get_page_as_image_bytes", lambda page_number, dpi=None, **kwargs: rendered_dpis.append(dpi) or render(page_number, dpi, **kwargs))
+
+            assert reader.get_pages_as_text_from_image([0, 1]) == {0: "ocr of scanned_page_0.jpg", 1: "ocr of scanned_page_1.jpg"}
+            assert len(fake_mineru) == 2
+            assert rendered_dpis == [reader.dpi, reader.dpi, OCR_RETRY_DPI, OCR_RETRY_DPI]
+            reader.get_pages_as_text_from_image([0], dpi=OCR_RETRY_DPI)
+            assert len(fake_mineru) == 3  # not retried again at the retry resolution
+
+    def test_missing_pdf_raises(self, tmp_path, database):
+        """Test that constructing a reader for a missing PDF fails immediately"""
+        with pytest.raises(FileNotFoundError):
+            LazyTextbookReader(tmp_path / "missing.pdf", None, database)  # type: ignore[arg-type]
+
+    def test_symlinked_pdf_keeps_its_own_name(self, tmp_path, born_digital_pdf, database):
+        """Test that a reader opened through a symlink names the book after the link, not the target"""
+        link = tmp_path / "calculus.pdf"
+        link.symlink_to(born_digital_pdf)
+        with LazyTextbookReader(link, None, database) as reader:  # type: ignore[arg-type]
+            assert reader.pdf_name == "calculus"
+            assert "the concept of function" in reader.get_page_content(0).lower()
+
+        dangling = tmp_path / "dangling.pdf"
+        dangling.symlink_to(tmp_path / "missing.pdf")
+        with pytest.raises(FileNotFoundError):
+            LazyTextbookReader(dangling, None, database)  # type: ignore[arg-type]
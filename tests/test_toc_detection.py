@@ -0,0 +1,129 @@
+"""
+Unit tests for the Bayesian TOC page detector
+"""
+import os
+# Set dummy API key to avoid import errors (tests don't use LLM)
+os.environ.setdefault("LLM_GEMINI_KEY", "dummy_key_for_testing")
+
+from textbook.utils import detect_toc
+
+TOC_PAGE = "\n".join(
+    ["Contents", "Preface ix"]
+    + [f"{chapter} Chapter title {chapter} {chapter * 12}" for chapter in range(1, 19)]
+    + ["Bibliography 301", "Index 310"]
+)
+
+PROSE_PAGE = "\n".join([
+    "In this chapter we study compact spaces.",
+    "A space is compact if every open cover has a finite subcover.",
+    "The proof of Theorem 2 uses the previous lemma.",
+])
+
+
+class TestDetectToc:
+    """Test suite for detect_toc"""
+
+    def test_toc_page_detected(self):
+        """Test that a typical contents page is detected"""
+        assert detect_toc(TOC_PAGE)
+
+    def test_prose_page_rejected(self):
+        """Test that a body text page is not detected"""
+        assert not detect_toc(PROSE_PAGE)
+
+    def test_empty_page_rejected(self):
+        """Test that an empty page is not detected"""
+        assert not detect_toc("")
+
+    def test_precomputed_log_likelihoods(self):
+        """Test that the likelihood tables carry the logs predict reads"""
+        import math
+        from textbook.utils.bayesian_detection import create_binary_likelihood_dict, create_distribution_dict
+
+        likelihoods = create_binary_likelihood_dict([("feature", 0.9, 0.2), ("other", 0.5, 0.1)])
+        assert likelihoods.names == ("feature", "other")
+        assert likelihoods.log_true[0] == math.log(0.9)
+        assert math.isclose(likelihoods.log1m_false[0], math.log(0.8))
+        distributions = create_distribution_dict([("count", 20, 5)])
+        assert distributions.names == ("count",)
+        assert distributions.log_lambda_false[0] == math.log(5)
+
+    def test_log_poisson_pmf(self):
+        """Test the log-space Poisson pmf against the direct formula and for counts whose factorial overflows floats"""
+        import math
+        from textbook.utils.bayesian_detection import log_poisson_pmf
+
+        assert math.isclose(log_poisson_pmf(3, math.log(5), 5), math.log(5**3 * math.exp(-5) / math.factorial(3)))
+        assert math.isfinite(log_poisson_pmf(400, math.log(20), 20))
+        # Both sides of the log factorial table boundary agree with lgamma
+        for x in (127, 128):
+            assert math.isclose(log_poisson_pmf(x, math.log(20), 20), x * math.log(20) - 20 - math.lgamma(x + 1))
+
+    def test_extract_features(self):
+        """Test that numbered lines are counted once each and only whole words count as numerals or keywords"""
+        from textbook.utils.toc_detection import extract_features
+
+        page = "Table of CONTENTS\n1 Sets 3 and 12\nH2O x2\n\nvii mix\nsee the index"
+        assert extract_features(page) == (True, True, 1, True)
+        assert extract_features("1st draft\n(3)\nindexes") == (False, False, 1, False)
+        assert extract_features("no numbers on this page") == (False, False, 0, False)
+        assert extract_features("chapitre \u0663\nété") == (False, False, 1, False)
+
+    def test_repeated_page_served_from_cache(self):
+        """Test that detecting the same page text twice extracts its features once"""
+        from textbook.utils.toc_detection import extract_features
+
+        extract_features.cache_clear()
+        detect_toc(TOC_PAGE)
+        detect_toc(TOC_PAGE)
+        info = extract_features.cache_info()
+        assert (info.hits, info.misses) == (1, 1)
+
+    def test_batch_matches_single_page(self):
+        """Test that detect_toc_batch returns the same decisions as detect_toc page by page"""
+        from textbook.utils import detect_toc_batch
+
+        pages = [TOC_PAGE, PROSE_PAGE, "", "Contents\nIndex", "\n".join(f"{n} Section {n}" for n in range(1, 16))]
+        assert detect_toc_batch(pages).tolist() == [detect_toc(page) for page in pages]
+        assert detect_toc_batch([]).shape == (0,)
+
+    def test_early_reject_agrees_with_predict(self):
+        """Test that every page the early reject skips would also be rejected by predict"""
+        from textbook.utils.bayesian_detection import predict
+        from textbook.utils import toc_detection
+
+        assert toc_detection._EARLY_REJECT_MAX_NUMS >= 3
+        for has_roman_numerals in (False, True):
+            for number_of_page_numbers in range(toc_detection._EARLY_REJECT_MAX_NUMS + 1):
+                probability = predict(
+                    (False, has_roman_numerals, False),
+                    (number_of_page_numbers,),
+                    toc_detection.LOG_PRIOR_TOC,
+                    toc_detection.LOG1M_PRIOR_TOC,
+                    toc_detection.BINARY_LIKELIHOODS,
+                    toc_detection.NUMERICAL_DISTRIBUTIONS,
+                )
+                assert probability <= toc_detection.TOC_DETECTION_THRESHOLD
+
+    def test_early_reject_disabled_when_no_count_is_accepted(self, monkeypatch):
+        """Test that the early reject bound search terminates and disables itself when the count never tips the decision"""
+        from textbook.utils import toc_detection
+        from textbook.utils.bayesian_detection import create_binary_likelihood_dict, create_distribution_dict
+
+        monkeypatch.setattr(toc_detection, "BINARY_LIKELIHOODS", create_binary_likelihood_dict([
+            ("has_keyword_contents", 0.90, 0.0001),
+            ("has_roman_numerals", 0.65, 0.3),
+            ("has_word_index_reference_bibliography_keywords", 0.95, 0.5),
+        ]))
+        monkeypatch.setattr(toc_detection, "NUMERICAL_DISTRIBUTIONS", create_distribution_dict([("number_of_page_numbers", 20, 20)]))
+        assert toc_detection._early_reject_max_numbers() == -1
+
+    def test_predict_saturates_without_overflow(self):
+        """Test that overwhelming evidence gives a plain float probability of 0 or 1 instead of overflowing"""
+        from textbook.utils.bayesian_detection import predict
+        from textbook.utils import toc_detection
+
+        args = (toc_detection.LOG_PRIOR_TOC, toc_detection.LOG1M_PRIOR_TOC, toc_detection.BINARY_LIKELIHOODS, toc_detection.NUMERICAL_DISTRIBUTIONS)
+        assert predict((True, True, True), (5000,), *args) == 1.0
+        rejected = predict((False, False, False), (0,), *args)
+        assert type(rejected) is float and rejected < 1e-6
@@ -1,5 +1,5 @@
 from .database import TextBookDatabase
 from .reader import LazyTextbookReader
-from .model import LLM
+from .model import LLM, get_llm
 
-__all__ = ["TextBookDatabase", "LazyTextbookReader", "LLM"]
\ No newline at end of file
+__all__ = ["TextBookDatabase", "LazyTextbookReader", "LLM", "get_llm"]
\ No newline at end of file
@@ -0,0 +1,74 @@
+# Building blocks shared by the on-disk caches (page text, LLM responses, embeddings)
+# SQLiteStore: SQLite file opened on first use, guarded by a lock so one connection can serve every thread
+# LRUCache: thread-safe in-memory LRU in front of a store
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Generic, Hashable, Optional, TypeVar
+
+CACHE_ROOT = Path.home() / ".cache" / "textbook" # Root directory of every default cache location
+SQLITE_MAX_VARIABLES = 900 # Stay below the default host parameter limit of older SQLite builds
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def env_flag(name: str) -> bool:
+    """Whether the env variable is set to 1, true or yes"""
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+class SQLiteStore:
+    def __init__(self, db_path: Path, create_table: str):
+        """
+        Args:
+            db_path: Path to the SQLite file, its directory is created on first use
+            create_table: CREATE TABLE IF NOT EXISTS statement run when the file is opened
+        """
+        self.db_path = Path(db_path)
+        self.create_table = create_table
+        # Hold while using the connection returned by connect()
+        self.lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def connect(self) -> sqlite3.Connection:
+        """Return the connection, opening the file on first use, the caller must hold lock"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(self.create_table)
+            self._conn.commit()
+        return self._conn
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._items: OrderedDict[K, V] = OrderedDict()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
@@ -29,8 +29,11 @@ from sqlalchemy.orm import (
     Session,
 )
 from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
 
+from textbook.cache_utils import SQLITE_MAX_VARIABLES
+
 
 class Base(DeclarativeBase):
     """Base class for all SQLAlchemy models"""
@@ -471,6 +474,53 @@ class TextBookDatabase:
             )
             return _try_save(session, chapter_info)
     
+    def bulk_create_chapters_and_sections(self, book_id: int, records: list[dict], replace: bool = False) -> list[int]:
+        """
+        Create the chapters and sections of a TOC in a single transaction
+
+        Args:
+            book_id: The ID of the book
+            records: Chapter dicts with keys title, index_string, start_page, end_page and sections,
+                     where sections is a list of dicts with the same keys (without sections)
+            replace: Delete the existing TOC of the book first, in the same transaction
+
+        Returns:
+            The IDs of the chapters created, titles that already exist for the book are skipped
+        """
+        with self.new_session() as session:
+            if replace:
+                _delete_sections_by_book_id(session, book_id)
+                _delete_chapters_by_book_id(session, book_id)
+
+            chapter_ids = _insert_ignoring_conflicts(session, ChapterInfo, [
+                {
+                    "title": record["title"],
+                    "book_index_string": record["index_string"],
+                    "start_page_number": record["start_page"],
+                    "end_page_number": record["end_page"],
+                    "book_id": book_id,
+                }
+                for record in records
+            ])
+
+            # Duplicate chapter titles resolve to the first chapter with that title, as in try_create_chapter_info
+            chapter_ids_by_title = {title: chapter_id for title, chapter_id in session.query(ChapterInfo.title, ChapterInfo.chapter_id).filter(ChapterInfo.book_id == book_id)}
+            _insert_ignoring_conflicts(session, SectionInfo, [
+                {
+                    "title": section["title"],
+                    "book_index_string": section["index_string"],
+                    "start_page_number": section["start_page"],
+                    "end_page_number": section["end_page"],
+                    "chapter_id": chapter_ids_by_title[record["title"]],
+                    "book_id": book_id,
+                }
+                for record in records
+                for section in record.get("sections", [])
+            ])
+
+            session.commit()
+            return sorted(chapter_ids)
+
     def get_chapters_by_book_id(self, book_id: int) -> list[ChapterInfo]:
         with self.new_session() as session:
             return _query_chapters_by_book_id(session, book_id)
@@ -523,10 +573,51 @@ class TextBookDatabase:
             )
             return _try_save(session, page_info)
 
+    def bulk_create_page_info(self, book_id: int, pages: list[tuple[int, str]]) -> dict[int, int]:
+        """
+        Create page summaries in a single transaction, pages that already exist are kept as is
+
+        Args:
+            book_id: The ID of the book
+            pages: (page_number, summary) pairs
+
+        Returns:
+            Mapping of page number to page ID for all given pages
+        """
+        if not pages:
+            return {}
+        with self.new_session() as session:
+            _insert_ignoring_conflicts(session, PageInfo, [
+                {"page_number": page_number, "summary": summary, "book_id": book_id}
+                for page_number, summary in pages
+            ], conflict_columns=("book_id", "page_number"))
+            session.commit()
+            page_numbers = [page_number for page_number, _ in pages]
+            rows = session.query(PageInfo.page_number, PageInfo.page_id).filter(PageInfo.book_id == book_id, PageInfo.page_number.in_(page_numbers))
+            return {page_number: page_id for page_number, page_id in rows}
+
     def get_page_info(self, page_id: int) -> Optional[PageInfo]:
         with self.new_session() as session:
             return _query_page_by_id(session, page_id)
 
+def _insert_ignoring_conflicts(session: Session, model: type[ChapterInfo] | type[SectionInfo] | type[PageInfo], rows: list[dict], conflict_columns: tuple[str, ...] = ("book_id", "title")) -> list[int]:
+    """Insert rows in as few statements as possible, skipping rows that conflict on conflict_columns. Returns the new IDs"""
+    if not rows:
+        return []
+
+    primary_key = model.__mapper__.primary_key[0]
+    rows_per_statement = max(SQLITE_MAX_VARIABLES // len(rows[0]), 1)
+    inserted_ids: list[int] = []
+    for start in range(0, len(rows), rows_per_statement):
+        statement = (
+            sqlite_insert(model)
+            .values(rows[start:start + rows_per_statement])
+            .on_conflict_do_nothing(index_elements=list(conflict_columns))
+            .returning(primary_key)
+        )
+        inserted_ids.extend(session.execute(statement).scalars())
+    return inserted_ids
+
 def _try_save(session: Session, obj: Base):
     return_field = None
     if isinstance(obj, ChapterInfo):
@@ -621,7 +712,6 @@ def _query_chapters_by_book_id_and_page_range(session: Session, book_id: int, st
 def _delete_chapters_by_book_id(session: Session, book_id: int) -> None:
     """Delete chapters by book ID"""
     session.query(ChapterInfo).filter(ChapterInfo.book_id == book_id).delete()
-    session.commit()
 
 # ------------------------------------------------------------
 # Section related functions
@@ -650,7 +740,6 @@ def _query_sections_by_book_id_and_page_range(session: Session, book_id: int, st
 def _delete_sections_by_book_id(session: Session, book_id: int) -> None:
     """Delete sections by book ID"""
     session.query(SectionInfo).filter(SectionInfo.book_id == book_id).delete()
-    session.commit()
 
 # ------------------------------------------------------------
 # Page related functions
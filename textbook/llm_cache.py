@@ -0,0 +1,240 @@
+# Response cache for LLM prompts
+# Exact tier: SQLite key/value store keyed by sha256(model + prompt + schema name and JSON digest [+ attachments])
+# Semantic tier (optional): in-memory matrix of prompt embeddings matched by cosine similarity
+# CachedEmbeddingModel: LRU + SQLite cache in front of an llm embedding model
+import os
+import json
+import hashlib
+import functools
+import threading
+from pathlib import Path
+from typing import Optional, List, Any, Iterable
+
+import numpy as np
+import structlog
+from llm import Attachment
+from pydantic import BaseModel
+
+from textbook.cache_utils import CACHE_ROOT, SQLITE_MAX_VARIABLES, SQLiteStore, LRUCache, env_flag
+
+DEFAULT_CACHE_PATH = CACHE_ROOT / "llm.sqlite"
+DEFAULT_EMBEDDING_CACHE_PATH = CACHE_ROOT / "embed.sqlite"
+EMBEDDING_CACHE_CAPACITY = int(os.getenv("EMBEDDING_CACHE_CAPACITY", "10000"))
+SEMANTIC_SIMILARITY_THRESHOLD = 0.95
+SEMANTIC_MAX_PROMPT_LENGTH = 2000 # Only embed short prompts, long ones rarely near-duplicate and are expensive to embed
+
+
+@functools.lru_cache(maxsize=None)
+def schema_cache_name(schema: type[BaseModel]) -> str:
+    """Schema name plus a digest of its JSON schema, entries stop matching once a field of the schema changes"""
+    schema_json = json.dumps(schema.model_json_schema(), sort_keys=True)
+    return f"{schema.__name__}:{hashlib.sha256(schema_json.encode('utf-8')).hexdigest()[:16]}"
+
+def make_cache_key(model_name: str, prompt: str, schema_name: str, attachments: Optional[List[Attachment]] = None) -> str:
+    hasher = hashlib.sha256()
+    hasher.update(f"{model_name}\0{prompt}\0{schema_name}".encode("utf-8"))
+    for attachment in attachments or []:
+        hasher.update(b"\0")
+        hasher.update(_attachment_digest(attachment))
+    return hasher.hexdigest()
+
+def _attachment_digest(attachment: Attachment) -> bytes:
+    if attachment.content is not None:
+        return hashlib.sha256(attachment.content).digest()
+    if attachment.path is not None:
+        with open(attachment.path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").digest()
+    return (attachment.url or "").encode("utf-8")
+
+
+class LLMResponseCache:
+    def __init__(self, db_path: Optional[Path] = None, embedding_model: Any = None, similarity_threshold: float = SEMANTIC_SIMILARITY_THRESHOLD):
+        """
+        Args:
+            db_path: Path to the SQLite file backing the exact cache
+            embedding_model: llm embedding model, enables the semantic tier when provided
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+        """
+        self.logger = structlog.get_logger(__name__)
+        self.db_path = Path(db_path) if db_path is not None else DEFAULT_CACHE_PATH
+        # Opened on first access, constructing the cache must not touch the disk
+        self._store = SQLiteStore(self.db_path, "CREATE TABLE IF NOT EXISTS llm_response (key TEXT PRIMARY KEY, response TEXT NOT NULL)")
+
+        # Guards the semantic tier
+        self._lock = threading.Lock()
+
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        # Semantic tier, rows of _vectors are unit-normalized prompt embeddings scoped by (model, schema)
+        self._vectors: Optional[np.ndarray] = None
+        self._vector_scopes: List[str] = []
+        self._vector_keys: List[str] = []
+
+    def get(self, model_name: str, prompt: str, schema_name: str, attachments: Optional[List[Attachment]] = None) -> Optional[str]:
+        key = make_cache_key(model_name, prompt, schema_name, attachments)
+        response = self._get_exact(key)
+        if response is not None:
+            self.logger.debug("LLM cache hit", key=key)
+            return response
+
+        if attachments or not self._semantic_enabled(prompt):
+            return None
+
+        similar_key = self._find_similar(f"{model_name}\0{schema_name}", prompt)
+        if similar_key is None:
+            return None
+        self.logger.debug("LLM semantic cache hit", key=similar_key)
+        return self._get_exact(similar_key)
+
+    def set(self, model_name: str, prompt: str, schema_name: str, response: str, attachments: Optional[List[Attachment]] = None) -> None:
+        key = make_cache_key(model_name, prompt, schema_name, attachments)
+        with self._store.lock:
+            conn = self._store.connect()
+            conn.execute("INSERT OR REPLACE INTO llm_response (key, response) VALUES (?, ?)", (key, response))
+            conn.commit()
+
+        if not attachments and self._semantic_enabled(prompt):
+            self._add_vector(f"{model_name}\0{schema_name}", prompt, key)
+
+    def close(self):
+        self._store.close()
+
+    def _get_exact(self, key: str) -> Optional[str]:
+        with self._store.lock:
+            row = self._store.connect().execute("SELECT response FROM llm_response WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _semantic_enabled(self, prompt: str) -> bool:
+        return self.embedding_model is not None and len(prompt) <= SEMANTIC_MAX_PROMPT_LENGTH
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        vector = np.asarray(self.embedding_model.embed(prompt), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _find_similar(self, scope: str, prompt: str) -> Optional[str]:
+        with self._lock:
+            if self._vectors is None:
+                return None
+            vectors, scopes, keys = self._vectors, list(self._vector_scopes), list(self._vector_keys)
+
+        query = self._embed(prompt)
+        in_scope = np.array([s == scope for s in scopes])
+        similarities = np.where(in_scope, np.dot(vectors, query), -1.0)
+        best_index = int(np.argmax(similarities))
+        if similarities[best_index] < self.similarity_threshold:
+            return None
+        return keys[best_index]
+
+    def _add_vector(self, scope: str, prompt: str, key: str) -> None:
+        vector = self._embed(prompt)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = vector[np.newaxis, :]
+            else:
+                self._vectors = np.vstack([self._vectors, vector])
+            self._vector_scopes.append(scope)
+            self._vector_keys.append(key)
+
+
+def create_default_cache(embedding_model: Any = None) -> Optional[LLMResponseCache]:
+    """Build the cache configured by LLM_CACHE_* env variables, None when disabled"""
+    if env_flag("LLM_CACHE_DISABLED"):
+        return None
+    db_path = os.getenv("LLM_CACHE_PATH")
+    semantic = env_flag("LLM_SEMANTIC_CACHE")
+    return LLMResponseCache(
+        db_path=Path(db_path) if db_path else None,
+        embedding_model=embedding_model if semantic else None,
+    )
+
+
+def create_embedding_cache(inner: Any, model_name: str) -> Any:
+    """Wrap the embedding model in the cache configured by EMBEDDING_CACHE_* env variables, the bare model when disabled"""
+    if env_flag("EMBEDDING_CACHE_DISABLED"):
+        return inner
+    db_path = os.getenv("EMBEDDING_CACHE_PATH")
+    return CachedEmbeddingModel(inner, model_name, db_path=Path(db_path) if db_path else None)
+
+
+class CachedEmbeddingModel:
+    """
+    Wraps an llm embedding model so each distinct text is embedded once.
+    Hits are served from an in-memory LRU, then from SQLite; only misses reach the provider, in one batch.
+    Vectors are rounded to float32 on every path, the same text embeds to the same values whether or not it was evicted.
+    Attributes not defined here are forwarded to the wrapped model.
+    """
+
+    def __init__(self, inner: Any, model_name: str, db_path: Optional[Path] = None, capacity: int = EMBEDDING_CACHE_CAPACITY):
+        self.inner = inner
+        self.model_name = model_name
+        self.capacity = capacity
+        self._memory: LRUCache[str, List[float]] = LRUCache(capacity)
+
+        self.db_path = Path(db_path) if db_path is not None else DEFAULT_EMBEDDING_CACHE_PATH
+        # Opened on first embedding, most LLM instances never embed anything
+        self._db = SQLiteStore(self.db_path, "CREATE TABLE IF NOT EXISTS embedding (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    def embed_multi(self, texts: Iterable[str]) -> List[List[float]]:
+        return self.embed_batch(list(texts))
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(set(keys))
+
+        misses: dict[str, str] = {}
+        for text, key in zip(texts, keys):
+            if key not in found:
+                misses.setdefault(key, text)
+
+        if misses:
+            vectors = list(self.inner.embed_multi(list(misses.values())))
+            computed = {key: np.asarray(vector, dtype=np.float32).tolist() for key, vector in zip(misses.keys(), vectors)}
+            self._store(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def _lookup(self, keys: set[str]) -> dict[str, List[float]]:
+        found: dict[str, List[float]] = {}
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                found[key] = vector
+
+        remaining = [key for key in keys if key not in found]
+        with self._db.lock:
+            for start in range(0, len(remaining), SQLITE_MAX_VARIABLES):
+                chunk = remaining[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.connect().execute(f"SELECT key, vector FROM embedding WHERE key IN ({placeholders})", chunk).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    found[key] = vector
+                    self._memory.set(key, vector)
+        return found
+
+    def _store(self, vectors: dict[str, List[float]]) -> None:
+        with self._db.lock:
+            conn = self._db.connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()],
+            )
+            conn.commit()
+        for key, vector in vectors.items():
+            self._memory.set(key, vector)
+
+    def close(self):
+        self._db.close()
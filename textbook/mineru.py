@@ -1,6 +1,10 @@
 # This class is used to wrap the request to call the MinerU API
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Union
+import asyncio
+import mimetypes
+import ijson
 import requests
+from requests.adapters import HTTPAdapter
 import os
 FIXED_PARAMS = {
     "output_dir": "./output",
@@ -20,9 +24,19 @@ FIXED_PARAMS = {
 }
 
 API_BASE_URL = os.getenv("MINERU_API_URL", "http://localhost:8000")
+MAX_CONNECTIONS = int(os.getenv("MINERU_MAX_CONNECTIONS", "16")) # Uploads kept in flight over pooled keep-alive connections
+
+# Shared across requests and threads so concurrent uploads reuse connections instead of reconnecting per page
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS))
 
 class MinerURequest:
-    def __init__(self, files: List[str]):
+    def __init__(self, files: List[Union[str, Tuple[str, bytes]]]):
+        """
+        Args:
+            files: Paths of the files to parse, or (file name, content) pairs for files held in memory
+        """
         self.files = files
         self.params = FIXED_PARAMS.copy()
 
@@ -68,6 +82,13 @@ class MinerURequest:
     def set_end_page_id(self, end_page_id: int):
         self.params["end_page_id"] = end_page_id
 
+    async def request_async(self) -> Dict[str, Any]:
+        """
+        Send the request without blocking the event loop, see request().
+        The upload runs on a worker thread, the shared connection pool bounds how many are in flight.
+        """
+        return await asyncio.to_thread(self.request)
+
     def request(self) -> Dict[str, Any]:
         """
         Send the request to the MinerU API and return the results dictionary.
@@ -83,13 +104,19 @@ class MinerURequest:
         file_handles = []
         
         try:
-            for file_path in self.files:
-                if not os.path.exists(file_path):
-                    raise FileNotFoundError(f"File not found: {file_path}")
+            for file in self.files:
+                if isinstance(file, tuple):
+                    # In-memory file, uploaded as is without touching the disk
+                    file_name, content = file
+                    content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+                    files_to_upload.append(('files', (file_name, content, content_type)))
+                    continue
+                if not os.path.exists(file):
+                    raise FileNotFoundError(f"File not found: {file}")
                 # Open file in binary mode and use the filename
-                file_obj = open(file_path, 'rb')
+                file_obj = open(file, 'rb')
                 file_handles.append(file_obj)
-                files_to_upload.append(('files', (os.path.basename(file_path), file_obj, 'application/pdf')))
+                files_to_upload.append(('files', (os.path.basename(file), file_obj, 'application/pdf')))
             
             # Prepare form data with all parameters
             data = {}
@@ -98,22 +125,27 @@ class MinerURequest:
                 # The requests library will properly format them
                 data[key] = value
             
-            # Make the POST request
-            response = requests.post(
+            # Make the POST request, streaming the body so it is parsed while it arrives
+            response = _SESSION.post(
                 endpoint,
                 files=files_to_upload,
                 data=data,
-                timeout=300  # 5 minute timeout for large files
+                timeout=300,  # 5 minute timeout for large files
+                stream=True,
             )
             
-            # Raise an exception for bad status codes
-            response.raise_for_status()
-            
-            # Return the JSON response as a dictionary
-            return response.json().get("results",{})
+            with response:
+                # Raise an exception for bad status codes
+                response.raise_for_status()
+
+                # Parse only the "results" object, other top-level fields are skipped without being materialized
+                response.raw.decode_content = True
+                return dict(ijson.kvitems(response.raw, "results", use_float=True))
             
         except requests.exceptions.RequestException as e:
             raise Exception(f"Failed to send request to MinerU API: {str(e)}")
+        except ijson.JSONError as e:
+            raise Exception(f"Failed to parse MinerU API response: {str(e)}")
         finally:
             # Close all file handles
             for file_handle in file_handles:
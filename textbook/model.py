@@ -1,51 +1,121 @@
 import os
-from typing import TypeVar, List
+import copy
+import functools
+from typing import TypeVar, List, Optional, Any, Dict
 
 
 import llm
 from llm import Attachment
+from llm.models import EmbeddingModel
 import structlog
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+
+from textbook.cache_utils import env_flag
+from textbook.llm_cache import create_default_cache, create_embedding_cache, schema_cache_name
 
 PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
 TEXT_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gemini-3-flash-preview")
+FAST_TEXT_MODEL_NAME = os.getenv("LLM_FAST_MODEL_NAME", "gemini-flash-lite-latest") # Smaller model for high-volume prompts such as page summaries
 EMBEDDING_MODEL_NAME = os.getenv("LLM_EMBEDDING_MODEL_NAME", "gemini-embedding-001")
 API_KEY = os.getenv("LLM_GEMINI_KEY")
 if API_KEY is None:
     raise ValueError("LLM_GEMINI_KEY is not set")
+SKIP_HEALTH_CHECK = env_flag("LLM_SKIP_HEALTH_CHECK")
 
 T = TypeVar("T", bound=BaseModel)
 
+@functools.lru_cache(maxsize=None)
+def _get_text_model(model_name: str) -> llm.Model:
+    # The plugin registry is walked on every lookup, only do it once per model
+    return llm.get_model(model_name) # type: ignore
+
+@functools.lru_cache(maxsize=None)
+def _get_embedding_model(model_name: str) -> EmbeddingModel:
+    return llm.get_embedding_model(model_name) # type: ignore
+
 class LLM:
+    # The health check round-trips the provider, run it at most once per process
+    _health_checked: bool = False
+
     def __init__(self):
         self.logger = structlog.get_logger("LLM")
-        self.text_model = llm.get_model(TEXT_MODEL_NAME) # type: ignore
-        self.embedding_model = llm.get_embedding_model(EMBEDDING_MODEL_NAME) # type: ignore
+        self.text_model = _get_text_model(TEXT_MODEL_NAME)
         self.text_model.key = API_KEY
-        self.embedding_model.key = API_KEY
+        self.fast_text_model = _get_text_model(FAST_TEXT_MODEL_NAME)
+        self.fast_text_model.key = API_KEY
+        # "accurate" serves the once-per-book prompts (book info, TOC), "fast" the per-page ones
+        self.model_tiers = {
+            "accurate": (TEXT_MODEL_NAME, self.text_model),
+            "fast": (FAST_TEXT_MODEL_NAME, self.fast_text_model),
+        }
+        embedding_model = _get_embedding_model(EMBEDDING_MODEL_NAME)
+        embedding_model.key = API_KEY
+        self.embedding_model = create_embedding_cache(embedding_model, EMBEDDING_MODEL_NAME)
+        self.cache = create_default_cache(self.embedding_model)
+        if SKIP_HEALTH_CHECK or LLM._health_checked:
+            return
         if not self.health_check():
             raise RuntimeError("LLM health check failed")
         else:
+            LLM._health_checked = True
             self.logger.info("LLM health check passed")
     
-    def prompt_with_schema(self, prompt: str, schema: type[T]) -> T:
-        self.logger.debug("Prompting LLM with prompt", prompt=prompt, schema=schema)
-        response = self.text_model.prompt(prompt, schema=schema)
-        self.logger.debug(f"Response: {response.text()}")
-        return schema.model_validate_json(response.text())
-
-    def prompt_with_schema_and_attachments(self, prompt: str, schema: type[T], attachments: List[Attachment]) -> T:
-        self.logger.debug("Prompting LLM with prompt", prompt=prompt, schema=schema, attachments=attachments)
-        response = self.text_model.prompt(prompt, schema=schema, attachments=attachments)
-        self.logger.debug(f"Response: {response.text()}")
-        return schema.model_validate_json(response.text())
+    def prompt_with_schema(self, prompt: str, schema: type[T], schema_json: Optional[Dict[str, Any]] = None, model_tier: str = "accurate") -> T:
+        self.logger.debug("Prompting LLM with prompt", prompt=prompt, schema=schema, model_tier=model_tier)
+        return self._prompt_parsed(prompt, schema, schema_json=schema_json, model_tier=model_tier)
+
+    def prompt_with_schema_and_attachments(self, prompt: str, schema: type[T], attachments: List[Attachment], schema_json: Optional[Dict[str, Any]] = None, model_tier: str = "accurate") -> T:
+        self.logger.debug("Prompting LLM with prompt", prompt=prompt, schema=schema, attachments=attachments, model_tier=model_tier)
+        return self._prompt_parsed(prompt, schema, attachments, schema_json=schema_json, model_tier=model_tier)
+
+    def _prompt_parsed(self, prompt: str, schema: type[T], attachments: Optional[List[Attachment]] = None, schema_json: Optional[Dict[str, Any]] = None, model_tier: str = "accurate") -> T:
+        if model_tier not in self.model_tiers:
+            raise ValueError(f"Unknown model tier: {model_tier}")
+        model_name, text_model = self.model_tiers[model_tier]
+
+        schema_name = schema_cache_name(schema)
+        if self.cache is not None:
+            cached = self.cache.get(model_name, prompt, schema_name, attachments)
+            if cached is not None:
+                try:
+                    return schema.model_validate_json(cached)
+                except ValidationError as e:
+                    # An entry written by an older version of the schema, prompt the model again and overwrite it
+                    self.logger.warning("Discarding cached LLM response that no longer validates", schema=schema.__name__, error=str(e))
+
+        # A pre-generated schema skips the per-call model_json_schema() reflection
+        # Copied because provider plugins rewrite the schema dict in place
+        prompt_schema = copy.deepcopy(schema_json) if schema_json is not None else schema
+        if attachments:
+            response = text_model.prompt(prompt, schema=prompt_schema, attachments=attachments)
+        else:
+            response = text_model.prompt(prompt, schema=prompt_schema)
+
+        # Some plugins already validate against the schema, reuse their result instead of parsing the text again
+        parsed = getattr(response, "output_parsed", None)
+        if isinstance(parsed, schema):
+            text = None
+        else:
+            # text() may block on a streaming response, materialize it only once
+            text = response.text()
+            parsed = schema.model_validate_json(text)
+        self.logger.debug("Response", response=parsed)
+
+        if self.cache is not None:
+            self.cache.set(model_name, prompt, schema_name, text if text is not None else parsed.model_dump_json(), attachments)
+        return parsed
     
     def health_check(self) -> bool:
         response = self.text_model.prompt("Where is the capital of France?")
         return "paris" in response.text().lower()
 
+@functools.lru_cache(maxsize=1)
+def get_llm() -> LLM:
+    """Return the process-wide LLM instance, creating it on first use"""
+    return LLM()
+
 if __name__ == "__main__":
-    llm = LLM()
-    print(llm.text_model.prompt("Counter the number of R in word strawberry"))
-    print(llm.embedding_model.embed("Hello, world!"))
\ No newline at end of file
+    text_llm = get_llm()
+    print(text_llm.text_model.prompt("Counter the number of R in word strawberry"))
+    print(text_llm.embedding_model.embed("Hello, world!"))
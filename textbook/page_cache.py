@@ -0,0 +1,60 @@
+# Cache of extracted page text for a single PDF
+# Memory tier: LRU of final page text keyed by (page_number, allow_ocr)
+# Disk tier: SQLite file per book holding OCR results only, since they cost a MinerU round-trip while text layer extraction is cheap
+import os
+import hashlib
+from pathlib import Path
+from typing import Optional, Tuple
+
+from textbook.cache_utils import CACHE_ROOT, SQLiteStore, LRUCache, env_flag
+
+DEFAULT_CACHE_DIR = CACHE_ROOT / "pages"
+PAGE_TEXT_CACHE_CAPACITY = 512 # Number of pages kept in memory per reader
+FINGERPRINT_BYTES = 4096 # Leading bytes of the PDF hashed to tell different files with the same name apart
+
+
+class PageTextCache:
+    def __init__(self, pdf_path: Path, capacity: int = PAGE_TEXT_CACHE_CAPACITY, cache_dir: Optional[Path] = None):
+        self.pdf_path = Path(pdf_path)
+        self.capacity = capacity
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else Path(os.getenv("PAGE_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.disabled = env_flag("PAGE_CACHE_DISABLED")
+
+        self._memory: LRUCache[Tuple[int, bool], str] = LRUCache(capacity)
+        # Opened on first OCR access, most born-digital books never need it
+        self._store = SQLiteStore(
+            self.cache_dir / f"{self.pdf_path.stem}.pages.sqlite",
+            "CREATE TABLE IF NOT EXISTS page_text (fingerprint TEXT, page_number INTEGER, text TEXT NOT NULL, PRIMARY KEY (fingerprint, page_number))",
+        )
+        self._fingerprint: Optional[str] = None
+
+    def get(self, page_number: int, allow_ocr: bool) -> Optional[str]:
+        return self._memory.get((page_number, allow_ocr))
+
+    def set(self, page_number: int, allow_ocr: bool, text: str) -> None:
+        self._memory.set((page_number, allow_ocr), text)
+
+    def get_ocr(self, page_number: int) -> Optional[str]:
+        if self.disabled:
+            return None
+        with self._store.lock:
+            row = self._store.connect().execute("SELECT text FROM page_text WHERE fingerprint = ? AND page_number = ?", (self._get_fingerprint(), page_number)).fetchone()
+        return row[0] if row else None
+
+    def set_ocr(self, page_number: int, text: str) -> None:
+        if self.disabled:
+            return
+        with self._store.lock:
+            conn = self._store.connect()
+            conn.execute("INSERT OR REPLACE INTO page_text (fingerprint, page_number, text) VALUES (?, ?, ?)", (self._get_fingerprint(), page_number, text))
+            conn.commit()
+
+    def close(self):
+        self._memory.clear()
+        self._store.close()
+
+    def _get_fingerprint(self) -> str:
+        if self._fingerprint is None:
+            with open(self.pdf_path, "rb") as f:
+                self._fingerprint = hashlib.sha1(f.read(FINGERPRINT_BYTES)).hexdigest()
+        return self._fingerprint
@@ -1,24 +1,45 @@
-import os
 from pathlib import Path
 import io
-import tempfile
-from typing import Optional, List, Tuple
+import asyncio
+import queue
+import hashlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, pairwise
+from typing import Optional, List, Tuple, Dict
 
 from PIL import Image
 import pymupdf
 
 from pydantic import BaseModel
+import pydantic_core
 import structlog
 
 from textbook.database import TextBookDatabase, BookInfo, ChapterInfo
 from textbook.model import LLM
+from textbook.cache_utils import CACHE_ROOT
 from llm import Attachment
 from textbook.mineru import MinerURequest
-from textbook.utils import detect_toc
+from textbook.page_cache import PageTextCache
+from textbook.utils import detect_toc_batch
 
 MAX_PAGE_FOR_TOC_DETECTION = 15 # Number of pages to read for TOC detection
 MAX_PAGE_FOR_ALIGNMENT_CHECK = 25 # Number of pages to read for alignment check in worst case, this is longer than the TOC detection because we may need to check both TOC and prefaces if TOC end is not set
 MIN_PAGE_CONTENT_LENGTH = 20 # Minimum length of page content to be considered valid
+PAGE_FETCH_CONCURRENCY = 8 # Number of pages fetched at once by get_pages_content_async
+PAGE_SUMMARY_CONCURRENCY = 16 # Number of page summary LLM requests in flight in summarize_pages
+PAGE_SUMMARY_SAVE_BATCH_SIZE = 32 # Number of page summaries saved per transaction in summarize_pages
+JPEG_QUALITY = 85 # Quality of page renders uploaded to MinerU
+PAGE_IMAGE_DPI = 100 # Default resolution of page renders, enough for OCR and TOC page images
+COVER_IMAGE_DPI = 150 # Resolution of the cover render sent with the book info prompt
+OCR_RETRY_DPI = 200 # Pages whose OCR text comes back shorter than MIN_PAGE_CONTENT_LENGTH are re-rendered at this resolution
+MINERU_BATCH_SIZE = 16 # Maximum number of page images uploaded in one MinerU request
+MINERU_TEXT_KEYS = ("md_content", "markdown", "content", "text") # Fields of a MinerU file result holding the page text, by priority
+TEXT_LAYER_SAMPLE_PAGES = 5 # Number of pages sampled to decide whether the PDF has a real text layer
+TEXT_LAYER_MIN_LENGTH = 200 # Minimum length of a sampled page's text for it to count as born-digital
+
+TOC_CACHE_DIR = CACHE_ROOT / "toc" # Extracted TOCs keyed by book file name and raw TOC text
 
 def cover_prompt(cover: str) -> str:
     return f"""
@@ -46,8 +67,8 @@ def toc_prompt(toc: str) -> str:
     {toc}
     """
 
-def page_summary_prompt(page: str, related_chapters: List[str], related_sections: List[str]) -> str:
-    return f"""
+# Built once, only the page text is filled in per page
+PAGE_SUMMARY_PROMPT_PREFIX = """
     Extract the summary of the following page text with rules:
     - use bullet points to summarize the page content, identify any key definitions or remarks, assume all the points will be used for an advance exam
     - if it contain more than one exercises, mark this page as containing exercise,
@@ -57,9 +78,13 @@ def page_summary_prompt(page: str, related_chapters: List[str], related_sections
     - all title should be in lower case
 
     Page: 
-     {page}
+     """
+PAGE_SUMMARY_PROMPT_SUFFIX = """
     """
 
+def page_summary_prompt(page: str) -> str:
+    return PAGE_SUMMARY_PROMPT_PREFIX + page + PAGE_SUMMARY_PROMPT_SUFFIX
+
 # Pydantic model for TOC
 class SectionSchema(BaseModel):
     index_string: str
@@ -88,146 +113,259 @@ class PageSchema(BaseModel):
     page_summary: List[PageSummarySchema]
     has_exercises: bool
 
+    @functools.cached_property
     def full_summary(self) -> str:
         return "\n".join([f"{summary.title}: {summary.summary}" for summary in self.page_summary])
 
+# JSON schemas handed to the LLM, generated once at import instead of on every prompt
+_TOC_SCHEMA_JSON = TocSchema.model_json_schema()
+_BOOK_SCHEMA_JSON = BookSchema.model_json_schema()
+_PAGE_SCHEMA_JSON = PageSchema.model_json_schema()
+
 
-def _save_images_to_temp_attachment(image: Image.Image) -> Attachment:
-    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-        tmp_path = tmp_file.name
-    image.save(tmp_path, 'PNG')
-    return Attachment(path=tmp_path, type="image/png")
+def _mineru_result_text(file_result) -> str:
+    # Take the first field holding the page text in priority order
+    if isinstance(file_result, dict):
+        for key in MINERU_TEXT_KEYS:
+            if key in file_result:
+                return str(file_result[key])
+    return ""
 
-def _remove_temp_attachment(attachment: Attachment):
-    if attachment.path and os.path.exists(attachment.path):
-        os.unlink(attachment.path)
+def _image_attachment(image_bytes: bytes) -> Attachment:
+    # Attach the rendered PNG from memory, no decode or temporary file
+    return Attachment(content=image_bytes, type="image/png")
 
 class LazyTextbookReader:
     
-    def __init__(self, pdf_path: Path, llm: LLM, database: TextBookDatabase, force_text_only_extraction: bool = False):
+    def __init__(self, pdf_path: Path, llm: LLM, database: TextBookDatabase, force_text_only_extraction: bool = False, dpi: int = PAGE_IMAGE_DPI, cover_dpi: int = COVER_IMAGE_DPI):
 
         self.logger = structlog.get_logger(__name__)
 
-        if not os.path.exists(pdf_path):
-            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
-        
-        self.pdf_path = pdf_path
+        # strict resolution raises FileNotFoundError for a missing PDF, no separate existence check needed
+        # The name comes from the path as given, a symlinked PDF keeps its own name rather than the target's
+        self.pdf_path = Path(pdf_path)
+        self.pdf_path.resolve(strict=True)
         self.pdf_name = self.pdf_path.stem
 
         self.llm = llm
 
         self.pdf_document: Optional[pymupdf.Document] = None
+
+        # pymupdf does not support multithreaded use, not even with one document per thread,
+        # every call into it holds this lock and threads only overlap on network I/O (LLM, MinerU)
+        self._pdf_lock = threading.RLock()
         
         self.database: TextBookDatabase = database
 
         self.force_text_only_extraction = force_text_only_extraction
 
+        # Render resolutions, the cover gets a sharper image than the OCR and TOC pages
+        self.dpi = dpi
+        self.cover_dpi = cover_dpi
+
         # Current book ID
         self.book_info: Optional[BookInfo] = None
 
-    def __enter__(self):
-        if not os.path.exists(self.pdf_path):
-            raise FileNotFoundError(f"PDF file not found: {self.pdf_path}")
+        # Extracted page text, OCR results persist across runs
+        self.page_cache = PageTextCache(self.pdf_path)
 
-        self.pdf_document = pymupdf.open(self.pdf_path)
+        # Set on enter
+        self._n_pages = 0
+        self._total_pages = 1
+        # Whether the PDF is born-digital, detected on enter
+        self._has_text_layer = False
+
+    def __enter__(self):
+        with self._pdf_lock:
+            self.pdf_document = pymupdf.open(self.pdf_path)
+            # Page count is fixed once opened, cache it instead of asking pymupdf on every page access
+            self._n_pages = len(self.pdf_document)
+        self._total_pages = max(self._n_pages, 1)
+        self._has_text_layer = self._detect_text_layer()
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.pdf_document:
-            self.pdf_document.close()
+        with self._pdf_lock:
+            if self.pdf_document:
+                self.pdf_document.close()
+        self.page_cache.close()
 
     # ------------------------------------------------------------
     # PDF related functions
     # ------------------------------------------------------------
+
+    def _detect_text_layer(self) -> bool:
+        if not self.pdf_document or self._n_pages == 0:
+            return False
+
+        sample_size = min(TEXT_LAYER_SAMPLE_PAGES, self._n_pages)
+        sample = {i * self._n_pages // sample_size for i in range(sample_size)}
+        pages_with_text = sum(1 for page_number in sample if len(self.get_page_as_text(page_number).strip()) >= TEXT_LAYER_MIN_LENGTH)
+        return pages_with_text * 2 > len(sample)
+
+    def _needs_ocr(self, page_number: int, extracted_text: str) -> bool:
+        if len(extracted_text) >= MIN_PAGE_CONTENT_LENGTH:
+            return False
+        if not self._has_text_layer:
+            return True
+        # Short pages in a born-digital PDF are usually blank or separator pages, only OCR the ones carrying images
+        if not self.pdf_document:
+            raise RuntimeError("PDF document not opened. Use context manager.")
+        with self._pdf_lock:
+            return len(self.pdf_document[page_number].get_images()) > 0
     
     def get_total_pages(self) -> int:
         if not self.pdf_document:
             raise RuntimeError("PDF document not opened. Use context manager.")
-        return max(len(self.pdf_document), 1)
+        return self._total_pages
     
     def get_page_as_text(self, page_number: int) -> str:
         if not self.pdf_document:
             raise RuntimeError("PDF document not opened. Use context manager.")
         
-        if page_number < 0 or page_number >= len(self.pdf_document):
-            raise ValueError(f"Page number {page_number} out of range [0, {len(self.pdf_document)})")
+        if page_number < 0 or page_number >= self._n_pages:
+            raise ValueError(f"Page number {page_number} out of range [0, {self._n_pages})")
         
-        page = self.pdf_document[page_number]
-        text = page.get_text()
+        with self._pdf_lock:
+            text = self.pdf_document[page_number].get_text()
         if isinstance(text, str):
             return text
         else:
             raise ValueError(f"Unsupported text type: {type(text)}")
     
-    def get_page_as_image(self, page_number: int, dpi: int = 150) -> Image.Image:
+    def get_page_as_image(self, page_number: int, dpi: Optional[int] = None, color: bool = False) -> Image.Image:
+        img_data = self.get_page_as_image_bytes(page_number, dpi, color=color)
+        img = Image.open(io.BytesIO(img_data))
+        return img
+    
+    def get_page_as_image_bytes(self, page_number: int, dpi: Optional[int] = None, image_format: str = "png", color: bool = False) -> bytes:
         if not self.pdf_document:
             raise RuntimeError("PDF document not opened. Use context manager.")
         
-        if page_number < 0 or page_number >= len(self.pdf_document):
-            raise ValueError(f"Page number {page_number} out of range [0, {len(self.pdf_document)})")
+        if page_number < 0 or page_number >= self._n_pages:
+            raise ValueError(f"Page number {page_number} out of range [0, {self._n_pages})")
         
-        page = self.pdf_document[page_number]
+        dpi = dpi or self.dpi
         mat = pymupdf.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat)
-        
-        img_data = pix.tobytes("png")
-        img = Image.open(io.BytesIO(img_data))
-        return img
-    
+        # Text pages read just as well in grayscale at a quarter of the RGBA bytes, only the cover is rendered in color
+        colorspace = pymupdf.csRGB if color else pymupdf.csGRAY
+        with self._pdf_lock:
+            pix = self.pdf_document[page_number].get_pixmap(matrix=mat, colorspace=colorspace, alpha=False)
+            if image_format == "jpeg":
+                return pix.tobytes("jpeg", jpg_quality=JPEG_QUALITY)
+            return pix.tobytes(image_format)
+
     def get_page_as_text_from_image(self, page_number: int) -> str:
+        return self.get_pages_as_text_from_image([page_number])[page_number]
+
+    def get_pages_as_text_from_image(self, page_numbers: List[int], dpi: Optional[int] = None) -> Dict[int, str]:
+        """OCR pages with MinerU, uploading up to MINERU_BATCH_SIZE page images per request"""
         if not self.pdf_document:
             raise RuntimeError("PDF document not opened. Use context manager.")
-        
-        img = self.get_page_as_image(page_number)
-        
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-            tmp_path = tmp_file.name
-        img.save(tmp_path, 'PNG')
-        
-        try:
-            request = MinerURequest(files=[tmp_path])
+
+        dpi = dpi or self.dpi
+        texts: Dict[int, str] = {}
+        unique_page_numbers = list(dict.fromkeys(page_numbers))
+        for start in range(0, len(unique_page_numbers), MINERU_BATCH_SIZE):
+            batch = unique_page_numbers[start:start + MINERU_BATCH_SIZE]
+
+            # Render straight to JPEG and upload from memory, no PIL decode/encode or temporary file
+            file_stems = {page_number: f"{self.pdf_name}_page_{page_number}" for page_number in batch}
+            request = MinerURequest(files=[(f"{file_stems[page_number]}.jpg", self.get_page_as_image_bytes(page_number, dpi, image_format="jpeg")) for page_number in batch])
             request.set_return_md(True)
             request.set_start_page_id(0)
-            request.set_end_page_id(0)
+            request.set_end_page_id(0) # Each upload is a single image
             
             results = request.request()
-            
-            if results:
-                for file_result in results.values():
-                    if 'md_content' in file_result:
-                        return file_result['md_content']
-                for file_result in results.values():
-                    if isinstance(file_result, dict):
-                        for key in ['content', 'text', 'markdown', 'md_content']:
-                            if key in file_result:
-                                return str(file_result[key])
-            
-            return ""
-        finally:
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+
+            # MinerU returns one result per uploaded file keyed by file name, fall back to upload order
+            ordered_results = list(results.values())
+            for index, page_number in enumerate(batch):
+                file_result = results.get(file_stems[page_number], results.get(f"{file_stems[page_number]}.jpg"))
+                if file_result is None and len(ordered_results) == len(batch):
+                    file_result = ordered_results[index]
+                texts[page_number] = _mineru_result_text(file_result)
+
+        # Small fonts may be unreadable at the default resolution, retry short results once at a higher one
+        short_pages = [page_number for page_number, text in texts.items() if len(text.strip()) < MIN_PAGE_CONTENT_LENGTH]
+        if short_pages and dpi < OCR_RETRY_DPI:
+            self.logger.info(f"Retrying OCR of {len(short_pages)} pages at {OCR_RETRY_DPI} DPI")
+            for page_number, text in self.get_pages_as_text_from_image(short_pages, OCR_RETRY_DPI).items():
+                if len(text.strip()) > len(texts[page_number].strip()):
+                    texts[page_number] = text
+
+        return texts
     
     def get_page_content(self, page_number: int, apply_alignment_offset: bool = False) -> str:
         if apply_alignment_offset and self.book_info is not None and self.book_info.book_alignment_offset is not None:
             page_number = page_number + self.book_info.book_alignment_offset
 
+        return self._get_page_text(page_number, allow_ocr=not self.force_text_only_extraction)
+
+    def prefetch_front_matter(self, number_of_pages: int = MAX_PAGE_FOR_TOC_DETECTION):
+        """OCR the cover and the TOC detection window in one batch so update_book_info and update_toc read from the cache, readers forced to text only extraction skip the OCR"""
+        self.get_text_for_pages(list(range(min(number_of_pages, self.get_total_pages()))), allow_ocr=not self.force_text_only_extraction)
+
+    def get_text_for_pages(self, page_numbers: List[int], allow_ocr: bool = True) -> Dict[int, str]:
+        """Extract many pages in one pass over the document, pages that need OCR are submitted to MinerU in one batch"""
+        texts: Dict[int, str] = {}
+        ocr_page_numbers = []
+        for page_number in sorted(set(page_numbers)):
+            extracted_text = self.page_cache.get(page_number, allow_ocr)
+            if extracted_text is None:
+                extracted_text = self.get_page_as_text(page_number).strip()
+                if allow_ocr and self._needs_ocr(page_number, extracted_text):
+                    extracted_text = self.page_cache.get_ocr(page_number)
+                    if extracted_text is None:
+                        ocr_page_numbers.append(page_number)
+                        continue
+                self.page_cache.set(page_number, allow_ocr, extracted_text)
+            texts[page_number] = extracted_text
+
+        if ocr_page_numbers:
+            self.logger.info(f"Extracting {len(ocr_page_numbers)} pages from images in one batch")
+            for page_number, ocr_text in self.get_pages_as_text_from_image(ocr_page_numbers).items():
+                self.page_cache.set_ocr(page_number, ocr_text)
+                self.page_cache.set(page_number, True, ocr_text)
+                texts[page_number] = ocr_text
+        return texts
+
+    def _get_page_text(self, page_number: int, allow_ocr: bool) -> str:
+        extracted_text = self.page_cache.get(page_number, allow_ocr)
+        if extracted_text is not None:
+            return extracted_text
+
         extracted_text = self.get_page_as_text(page_number).strip()
+        if allow_ocr and self._needs_ocr(page_number, extracted_text):
+            ocr_text = self.page_cache.get_ocr(page_number)
+            if ocr_text is None:
+                self.logger.warning(f"Page {page_number} content is too short, try to extract from image")
+                ocr_text = self.get_page_as_text_from_image(page_number)
+                self.page_cache.set_ocr(page_number, ocr_text)
+            extracted_text = ocr_text
+
+        self.page_cache.set(page_number, allow_ocr, extracted_text)
+        return extracted_text
+    
+    async def get_page_content_async(self, page_number: int, apply_alignment_offset: bool = False) -> str:
+        # Page extraction is serialized on the PDF lock, the worker thread lets a MinerU upload overlap with other pages
+        return await asyncio.to_thread(self.get_page_content, page_number, apply_alignment_offset)
 
-        if len(extracted_text) < MIN_PAGE_CONTENT_LENGTH and not self.force_text_only_extraction:
-            self.logger.warning(f"Page {page_number} content is too short, try to extract from image")
-            return self.get_page_as_text_from_image(page_number)
-        else:
-            return extracted_text
+    async def get_pages_content_async(self, page_numbers: List[int], concurrency: int = PAGE_FETCH_CONCURRENCY, apply_alignment_offset: bool = False) -> List[str]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(page_number: int) -> str:
+            async with semaphore:
+                return await self.get_page_content_async(page_number, apply_alignment_offset)
+
+        return await asyncio.gather(*(fetch(page_number) for page_number in page_numbers))
     
-    def get_page_content_with_image(self, page_number: int, apply_alignment_offset: bool = False) -> Tuple[str, Image.Image]:
+    def get_page_content_with_image(self, page_number: int, apply_alignment_offset: bool = False, color: bool = False, dpi: Optional[int] = None) -> Tuple[str, bytes]:
         if apply_alignment_offset and self.book_info is not None and self.book_info.book_alignment_offset is not None:
             page_number = page_number + self.book_info.book_alignment_offset
 
-        image = self.get_page_as_image(page_number)
-
-        extracted_text = self.get_page_as_text(page_number).strip()
-        if len(extracted_text) < MIN_PAGE_CONTENT_LENGTH:
-            extracted_text = self.get_page_as_text_from_image(page_number)
+        image = self.get_page_as_image_bytes(page_number, dpi, color=color)
+        extracted_text = self._get_page_text(page_number, allow_ocr=True)
 
         return extracted_text, image
 
@@ -246,10 +384,10 @@ class LazyTextbookReader:
     
     def update_book_info(self):
         self.logger.debug(f"Updating book info for {self.pdf_name}")
-        cover_text, cover_image = self.get_page_content_with_image(0) # Get the first page of the book
-        cover = _save_images_to_temp_attachment(cover_image)
-        book_basic_info = self.llm.prompt_with_schema_and_attachments(cover_prompt(cover_text), schema=BookSchema, attachments=[cover])
-        _remove_temp_attachment(cover)
+        self.prefetch_front_matter()
+        cover_text, cover_image = self.get_page_content_with_image(0, color=True, dpi=self.cover_dpi) # Get the first page of the book
+        cover = _image_attachment(cover_image)
+        book_basic_info = self.llm.prompt_with_schema_and_attachments(cover_prompt(cover_text), schema=BookSchema, attachments=[cover], schema_json=_BOOK_SCHEMA_JSON)
         # deserialize the response to a BookBasicInfo object
         book_info = self.database.create_book(book_basic_info.book_name, book_basic_info.book_author, book_basic_info.book_keywords, self.pdf_name, self.get_total_pages())
         self.book_info = book_info
@@ -274,51 +412,59 @@ class LazyTextbookReader:
             self.logger.info(f"TOC already exists for book {self.book_info.book_id}, skipping overwrite")
             return
 
-        # TODO: Remove caching
-        # if caching and os.path.exists("toc.json"):
-        #     with open("toc.json", "r") as f:
-        #         toc = json.load(f)
-        #         self.save_toc(toc)
-        #         return toc
+        # Locate the TOC on page text alone, pages are only rendered once we know which ones go to the LLM
+        number_of_pages = min(MAX_PAGE_FOR_TOC_DETECTION, self.get_total_pages())
+        texts_by_page = self.get_text_for_pages(list(range(number_of_pages)))
+        page_texts = [texts_by_page[page_num] for page_num in range(number_of_pages)]
+        is_toc_flags = detect_toc_batch(page_texts)
 
-        toc = ""
-        toc_start = False
-        number_of_toc_pages = 0
+        toc_start_page = next((page_num for page_num, is_toc in enumerate(is_toc_flags) if is_toc), None)
         toc_end_page = 0
-        images: List[Attachment] = []
-        for page_num in range(0, MAX_PAGE_FOR_TOC_DETECTION):
-            page_text, page_image = self.get_page_content_with_image(page_num)
-
-            images.append(_save_images_to_temp_attachment(page_image))
-            is_toc = detect_toc(page_text)
-            if not toc_start and is_toc:
-                toc_start = True
-            if toc_start:
-                toc += page_text
-                number_of_toc_pages += 1
-            if toc_start and not is_toc:
-                toc_end_page = page_num
-                break
+        if toc_start_page is None:
+            self.logger.warning(f"No TOC page detected for book {self.book_info.book_id}, relying on page images")
+            toc = ""
+            toc_page_numbers = list(range(number_of_pages))
+        else:
+            toc_end_page = next((page_num for page_num in range(toc_start_page + 1, number_of_pages) if not is_toc_flags[page_num]), 0)
+            # The first page after the TOC is kept, it may hold the tail of the last TOC entry
+            toc_page_numbers = list(range(toc_start_page, toc_end_page + 1 if toc_end_page else number_of_pages))
+            toc = "".join(page_texts[page_num] for page_num in toc_page_numbers)
 
         self.database.update_book_toc_end_page(self.book_info.book_id, toc_end_page)
 
-
+        cache_path = self._toc_cache_path(toc)
+        if caching and cache_path.exists():
+            self.logger.info(f"Loading cached TOC for book {self.book_info.book_id} from {cache_path}")
+            try:
+                # Parse once into plain dicts for save_toc, validation runs on them without building and dumping models
+                cached_toc = pydantic_core.from_json(cache_path.read_bytes())
+                TocSchema.model_validate(cached_toc)
+            except ValueError as e:
+                # Corrupt or written for an older TocSchema, extract the TOC again and overwrite the file
+                self.logger.warning(f"Ignoring invalid cached TOC {cache_path}: {e}")
+            else:
+                self.save_toc(cached_toc)
+                return
+
+        images: List[Attachment] = [_image_attachment(self.get_page_as_image_bytes(page_number)) for page_number in toc_page_numbers]
         try:
             self.logger.info(f"Sending TOC to LLM for book {self.book_info.book_id}, {toc[:100]}... ")
-            toc = self.llm.prompt_with_schema_and_attachments(toc_prompt(toc), schema=TocSchema, attachments=images)
+            toc = self.llm.prompt_with_schema_and_attachments(toc_prompt(toc), schema=TocSchema, attachments=images, schema_json=_TOC_SCHEMA_JSON)
             self.logger.info(f"TOC extracted for book {self.book_info.book_id}")
-            for image in images:
-                _remove_temp_attachment(image)
         except Exception as e:
             self.logger.error(f"Failed to extract TOC for book {self.book_info.book_id}: {e}")
             raise ValueError(f"Failed to extract TOC for book {self.book_info.book_id}: {e}")
 
-        # if caching:
-        #     with open("toc.json", "w") as f:
-        #         f.write(toc.model_dump_json())
+        if caching:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_bytes(pydantic_core.to_json(toc))
 
         self.save_toc(toc.model_dump())
     
+    def _toc_cache_path(self, toc_raw: str) -> Path:
+        digest = hashlib.sha256(toc_raw.encode("utf-8")).hexdigest()[:12]
+        return TOC_CACHE_DIR / f"{self.pdf_name}_{digest}.json"
+
     def delete_toc(self):
         if self.book_info is None or self.book_info.book_id is None:
             raise ValueError("Book basic information not extracted, please extract it first")
@@ -335,16 +481,9 @@ class LazyTextbookReader:
     
     @staticmethod
     def generate_block_with_range(block_list, end_page_number: int):
-        # append a end placeholder chapter to the target list
-        block_list.append({
-            "title": "<END>",
-            "page_number": end_page_number,
-        })
-
-        for i in range(len(block_list)-1):
-            block = block_list[i]
-            next_block = block_list[i+1]
-
+        # pair each block with the next one, an end placeholder closes the last block without touching the caller's list
+        end_block = {"title": "<END>", "page_number": end_page_number}
+        for block, next_block in pairwise(chain(block_list, [end_block])):
             yield block, block['page_number'], next_block['page_number']-1
 
 
@@ -352,34 +491,27 @@ class LazyTextbookReader:
         if self.book_info is None or self.book_info.book_id is None:
             raise ValueError("Book basic information not extracted, please extract it first")
         
-        # delete the existing TOC
-        self.logger.info(f"Deleting existing TOC for book {self.book_info.book_id} before saving new TOC")
-        self.delete_toc()
-        
+        records = []
         for chapter, start_page_number, end_page_number in self.generate_block_with_range(toc["chapters"], self.get_total_pages()-1):
-            chapter_id = self.database.try_create_chapter_info(
-                self.book_info.book_id,
-                title=chapter["title"],
-                index_string=chapter["index_string"],
-                start_page=start_page_number,
-                end_page=end_page_number,
-            )
-
-            if chapter_id is None:
-                continue
-                
-            for section, start_page_number, end_page_number in self.generate_block_with_range(chapter["sections"], end_page_number+1): # +1 because the end page number from the parent chapter is inclusive
-                section_id = self.database.try_create_section_info(
-                    self.book_info.book_id,
-                    chapter_id,
-                    title=section["title"],
-                    index_string=section["index_string"],
-                    start_page=start_page_number,
-                    end_page=end_page_number,
-                )
-
-                if section_id is None:
-                    continue
+            sections = []
+            for section, section_start_page_number, section_end_page_number in self.generate_block_with_range(chapter["sections"], end_page_number+1): # +1 because the end page number from the parent chapter is inclusive
+                sections.append({
+                    "title": section["title"],
+                    "index_string": section["index_string"],
+                    "start_page": section_start_page_number,
+                    "end_page": section_end_page_number,
+                })
+            records.append({
+                "title": chapter["title"],
+                "index_string": chapter["index_string"],
+                "start_page": start_page_number,
+                "end_page": end_page_number,
+                "sections": sections,
+            })
+
+        # The existing TOC is replaced in the same transaction as the insert
+        self.logger.info(f"Replacing existing TOC for book {self.book_info.book_id}")
+        self.database.bulk_create_chapters_and_sections(self.book_info.book_id, records, replace=True)
 
     # ------------------------------------------------------------
     # Alignment related functions
@@ -402,23 +534,16 @@ class LazyTextbookReader:
             print("Not enough chapters to check alignment, skipping alignment check")
             return []
 
-        results = []
-
         offset = self.database.get_book_alignment_offset(self.book_info.book_id, default_value=0)
-        chapter_2_page_number = chapters[1].start_page_number
-        page_text = self.get_page_content(chapter_2_page_number + offset)
-
-        results.append(page_text)
+        page_numbers = [chapters[1].start_page_number + offset]
 
         sections = self.database.get_sections_by_book_id(self.book_info.book_id)
-        if len(sections) < 1:
-            return results
+        if len(sections) >= 1:
+            page_numbers.append(sections[0].start_page_number + offset)
 
-        section_1_page_number = sections[0].start_page_number
-        section_1_text = self.get_page_content(section_1_page_number + offset)
-        results.append(section_1_text)
-
-        return results
+        # Both pages are extracted together, any OCR they need goes out in one request
+        texts = self.get_text_for_pages(page_numbers, allow_ocr=not self.force_text_only_extraction)
+        return [texts[page_number] for page_number in page_numbers]
     
     # ------------------------------------------------------------
     # Page related functions
@@ -428,15 +553,68 @@ class LazyTextbookReader:
         if self.book_info is None or self.book_info.book_id is None:
             raise ValueError("Book basic information not extracted, please extract it first")
 
-        # get the related chapters and sections
-        related_chapters = [chapter.title for chapter in self.database.get_chapters_by_book_id_and_page_range(self.book_info.book_id, page_number, page_number)]
-        related_sections = [section.title for section in self.database.get_sections_by_book_id_and_page_range(self.book_info.book_id, page_number, page_number)]
-        
-        page_text = self.get_page_content(page_number)
-        page_summary = self.llm.prompt_with_schema(page_summary_prompt(page_text, related_chapters, related_sections), schema=PageSchema)
-
-        page_id = self.database.try_create_page_info(self.book_info.book_id, page_number, page_summary.full_summary())
+        page_summary = self._summarize_page(page_number)
+        page_id = self.database.try_create_page_info(self.book_info.book_id, page_number, page_summary.full_summary)
 
         return page_id
 
+    async def create_or_update_page_info_async(self, page_number: int):
+        return await asyncio.to_thread(self.create_or_update_page_info, page_number)
+
+    async def summarize_pages(self, page_numbers: List[int], concurrency: int = PAGE_SUMMARY_CONCURRENCY) -> Dict[int, int]:
+        """
+        Summarize many pages with up to `concurrency` LLM requests in flight, saving the summaries in batches on a writer thread
+
+        Returns:
+            Mapping of page number to page ID
+        """
+        if self.book_info is None or self.book_info.book_id is None:
+            raise ValueError("Book basic information not extracted, please extract it first")
+        book_id = self.book_info.book_id
+
+        # A single writer thread owns the inserts, LLM workers hand summaries over and move on to the next page
+        save_queue: "queue.Queue[Optional[Tuple[int, str]]]" = queue.Queue()
+        page_ids: Dict[int, int] = {}
+        writer = ThreadPoolExecutor(max_workers=1)
+        writer_done = writer.submit(self._write_page_summaries, book_id, save_queue, page_ids)
+
+        # A dedicated pool bounds the LLM requests in flight, the default executor is capped at min(32, cpu + 4) threads
+        summary_executor = ThreadPoolExecutor(max_workers=concurrency)
+        loop = asyncio.get_running_loop()
 
+        async def summarize(page_number: int):
+            page_summary = await loop.run_in_executor(summary_executor, self._summarize_page, page_number)
+            save_queue.put((page_number, page_summary.full_summary))
+
+        tasks = [asyncio.ensure_future(summarize(page_number)) for page_number in page_numbers]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # On failure drop the pages no worker has started and let the running ones queue their summaries,
+            # nothing may be queued after the sentinel or it would never be written
+            summary_executor.shutdown(wait=False, cancel_futures=True)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            save_queue.put(None)
+            writer.shutdown(wait=False)
+            await asyncio.wrap_future(writer_done)
+        return page_ids
+
+    def _write_page_summaries(self, book_id: int, save_queue: "queue.Queue[Optional[Tuple[int, str]]]", page_ids: Dict[int, int]):
+        # Save whatever has queued up, up to PAGE_SUMMARY_SAVE_BATCH_SIZE per transaction, until the None sentinel arrives
+        done = False
+        while not done:
+            batch: List[Tuple[int, str]] = []
+            item = save_queue.get()
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= PAGE_SUMMARY_SAVE_BATCH_SIZE or save_queue.empty():
+                    break
+                item = save_queue.get()
+            done = item is None
+            if batch:
+                page_ids.update(self.database.bulk_create_page_info(book_id, batch))
+
+    def _summarize_page(self, page_number: int) -> PageSchema:
+        # The prompt is built from the page text alone, chapters and sections covering the page are not looked up
+        page_text = self.get_page_content(page_number)
+        return self.llm.prompt_with_schema(page_summary_prompt(page_text), schema=PageSchema, schema_json=_PAGE_SCHEMA_JSON, model_tier="fast")
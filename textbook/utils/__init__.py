@@ -1,3 +1,3 @@
-from .toc_detection import detect_toc
+from .toc_detection import detect_toc, detect_toc_batch
 
-__all__ = ["detect_toc"]
\ No newline at end of file
+__all__ = ["detect_toc", "detect_toc_batch"]
\ No newline at end of file
@@ -1,52 +1,102 @@
 import math
-from typing import Dict
+from collections.abc import Sequence
+from dataclasses import dataclass
 import numpy as np
 
-def poisson_pdf(x: int, lambda_value: float) -> float:
-    return (lambda_value**x * math.exp(-lambda_value)) / math.factorial(x)
+# Likelihoods are stored as parallel tuples ordered by feature index (names[i] is feature i),
+# observations are passed in the same order so predict needs no string lookups.
+# The scalar predict only uses math, numpy ufunc dispatch costs more than the arithmetic on a handful of floats;
+# predict_batch converts the tuples to arrays once per batch
+
+@dataclass(frozen=True)
+class BinaryLikelihoods:
+    names: tuple[str, ...]
+    log_true: tuple[float, ...] # log P(feature | TOC)
+    log1m_true: tuple[float, ...] # log (1 - P(feature | TOC))
+    log_false: tuple[float, ...] # log P(feature | not TOC)
+    log1m_false: tuple[float, ...] # log (1 - P(feature | not TOC))
+
+@dataclass(frozen=True)
+class PoissonDistributions:
+    names: tuple[str, ...]
+    lambda_true: tuple[float, ...]
+    log_lambda_true: tuple[float, ...]
+    lambda_false: tuple[float, ...]
+    log_lambda_false: tuple[float, ...]
+
+LOG_FACTORIAL_TABLE_SIZE = 128 # Counts below this read log(x!) from the table, page feature counts are small
+LOG_FACTORIAL_TABLE = tuple(math.lgamma(x + 1) for x in range(LOG_FACTORIAL_TABLE_SIZE))
+_LOG_FACTORIAL_ARRAY = np.array(LOG_FACTORIAL_TABLE, dtype=np.float64)
+
+def log_poisson_pmf(x: int, log_lambda: float, lambda_value: float) -> float:
+    # Evaluated in log space, no factorial overflow for large x and no underflow to 0 that would need clamping
+    log_factorial = LOG_FACTORIAL_TABLE[x] if x < LOG_FACTORIAL_TABLE_SIZE else math.lgamma(x + 1)
+    return x * log_lambda - lambda_value - log_factorial
 
 def predict(
-    binary_features: Dict[str, bool], numerical_features: Dict[str, int], prior: float, binary_likelihoods: Dict[str, Dict[str, float]], numerical_distributions: Dict[str, Dict[str, Dict[str, int]]]
+    binary_observations: Sequence[bool], numerical_values: Sequence[int], log_prior: float, log1m_prior: float, binary_likelihoods: BinaryLikelihoods, numerical_distributions: PoissonDistributions
 ) -> float:
-    log_p_true = np.log(prior)
-    log_p_false = np.log(1 - prior)
-
-    # Handle binary features
-    for feature, observed in binary_features.items():
-        if observed:
-            log_p_true += np.log(binary_likelihoods["TRUE"][feature])
-            log_p_false += np.log(binary_likelihoods["FALSE"][feature])
-        else:
-            log_p_true += np.log(1 - binary_likelihoods["TRUE"][feature])
-            log_p_false += np.log(1 - binary_likelihoods["FALSE"][feature])
+    # log(prior) and log(1 - prior) come precomputed from the caller, the prior is a constant
+    log_p_true = log_prior
+    log_p_false = log1m_prior
+
+    # Handle binary features, the log likelihoods are precomputed by create_binary_likelihood_dict
+    for observed, log_true, log1m_true, log_false, log1m_false in zip(
+        binary_observations, binary_likelihoods.log_true, binary_likelihoods.log1m_true, binary_likelihoods.log_false, binary_likelihoods.log1m_false
+    ):
+        log_p_true += log_true if observed else log1m_true
+        log_p_false += log_false if observed else log1m_false
 
     # Handle numerical features
-    for feature, value in numerical_features.items():
-        true_params = numerical_distributions["TRUE"][feature]
-        false_params = numerical_distributions["FALSE"][feature]
+    for value, lambda_true, log_lambda_true, lambda_false, log_lambda_false in zip(
+        numerical_values, numerical_distributions.lambda_true, numerical_distributions.log_lambda_true, numerical_distributions.lambda_false, numerical_distributions.log_lambda_false
+    ):
+        log_p_true += log_poisson_pmf(value, log_lambda_true, lambda_true)
+        log_p_false += log_poisson_pmf(value, log_lambda_false, lambda_false)
+
+    # Normalize, P(TOC) is the sigmoid of the log odds, exp would overflow once the log odds against pass 709
+    log_odds_against = log_p_false - log_p_true
+    return 1.0 / (1.0 + math.exp(log_odds_against)) if log_odds_against < 500 else 0.0
 
-        p_true = poisson_pdf(value, true_params["lambda"])
-        p_false = poisson_pdf(value, false_params["lambda"])
+def predict_batch(
+    binary_observations: np.ndarray, numerical_values: np.ndarray, log_prior: float, log1m_prior: float, binary_likelihoods: BinaryLikelihoods, numerical_distributions: PoissonDistributions
+) -> np.ndarray:
+    """Vectorized predict over N samples, binary_observations is (N, binary features) and numerical_values is (N, numerical features)"""
+    # lgamma has no numpy ufunc, counts are looked up in the log factorial table and only the rare large ones call lgamma
+    log_factorials = _LOG_FACTORIAL_ARRAY[np.minimum(numerical_values, LOG_FACTORIAL_TABLE_SIZE - 1)]
+    large = numerical_values >= LOG_FACTORIAL_TABLE_SIZE
+    if large.any():
+        log_factorials[large] = [math.lgamma(value + 1) for value in numerical_values[large].tolist()]
 
-        log_p_true += np.log(p_true + 1e-10)
-        log_p_false += np.log(p_false + 1e-10)
+    log_p_true = (
+        log_prior
+        + np.where(binary_observations, np.asarray(binary_likelihoods.log_true), np.asarray(binary_likelihoods.log1m_true)).sum(axis=1)
+        + (numerical_values * np.asarray(numerical_distributions.log_lambda_true) - np.asarray(numerical_distributions.lambda_true) - log_factorials).sum(axis=1)
+    )
+    log_p_false = (
+        log1m_prior
+        + np.where(binary_observations, np.asarray(binary_likelihoods.log_false), np.asarray(binary_likelihoods.log1m_false)).sum(axis=1)
+        + (numerical_values * np.asarray(numerical_distributions.log_lambda_false) - np.asarray(numerical_distributions.lambda_false) - log_factorials).sum(axis=1)
+    )
 
     # Normalize
-    log_sum = np.logaddexp(log_p_true, log_p_false)
-    return np.exp(log_p_true - log_sum)
-
-def create_binary_likelihood_dict(param_list: list[tuple[str, float, float]]) -> dict[str, dict[str, float]]:
-    true_likelihood_dict = {}
-    false_likelihood_dict = {}
-    for name, true_likelihood, false_likelihood in param_list:
-        true_likelihood_dict[name] = true_likelihood
-        false_likelihood_dict[name] = false_likelihood
-    return {"TRUE": true_likelihood_dict, "FALSE": false_likelihood_dict}
-
-def create_distribution_dict(param_list: list[tuple[str, int, int]]) -> Dict[str, Dict[str, Dict[str, int]]]:
-    true_distribution = {}
-    false_distribution = {}
-    for name, true_lambda, false_lambda in param_list:
-        true_distribution[name] = {"lambda": true_lambda}
-        false_distribution[name] = {"lambda": false_lambda}
-    return {"TRUE": true_distribution, "FALSE": false_distribution}
\ No newline at end of file
+    return np.exp(log_p_true - np.logaddexp(log_p_true, log_p_false))
+
+def create_binary_likelihood_dict(param_list: list[tuple[str, float, float]]) -> BinaryLikelihoods:
+    # The likelihoods are constants, log(p) and log(1-p) are computed here once instead of on every predict
+    return BinaryLikelihoods(
+        names=tuple(name for name, _, _ in param_list),
+        log_true=tuple(math.log(true_likelihood) for _, true_likelihood, _ in param_list),
+        log1m_true=tuple(math.log1p(-true_likelihood) for _, true_likelihood, _ in param_list),
+        log_false=tuple(math.log(false_likelihood) for _, _, false_likelihood in param_list),
+        log1m_false=tuple(math.log1p(-false_likelihood) for _, _, false_likelihood in param_list),
+    )
+
+def create_distribution_dict(param_list: list[tuple[str, int, int]]) -> PoissonDistributions:
+    return PoissonDistributions(
+        names=tuple(name for name, _, _ in param_list),
+        lambda_true=tuple(float(true_lambda) for _, true_lambda, _ in param_list),
+        log_lambda_true=tuple(math.log(true_lambda) for _, true_lambda, _ in param_list),
+        lambda_false=tuple(float(false_lambda) for _, _, false_lambda in param_list),
+        log_lambda_false=tuple(math.log(false_lambda) for _, _, false_lambda in param_list),
+    )
@@ -1,9 +1,15 @@
 
 import re
-from .bayesian_detection import predict, create_binary_likelihood_dict, create_distribution_dict
+import math
+import functools
+import numpy as np
+from .bayesian_detection import LOG_FACTORIAL_TABLE_SIZE, predict, predict_batch, create_binary_likelihood_dict, create_distribution_dict
 
 PRIOR_TOC = 0.5
+LOG_PRIOR_TOC = math.log(PRIOR_TOC)
+LOG1M_PRIOR_TOC = math.log1p(-PRIOR_TOC)
 TOC_DETECTION_THRESHOLD = 0.05
+TOC_DETECTION_CACHE_SIZE = 2048 # Number of page texts to remember extracted features for, blank and boilerplate pages repeat across books
 
 BINARY_LIKELIHOODS = create_binary_likelihood_dict([
     ("has_keyword_contents", 0.90, 0.0001),
@@ -15,68 +21,80 @@ NUMERICAL_DISTRIBUTIONS = create_distribution_dict([
     ("number_of_page_numbers", 20, 5),
 ])
 
+# Compiled once at import, detect_toc runs on every front matter page of every book
+ROMAN_NUMERAL_PATTERN = re.compile(r"\b[ivxlcdm]+\b")
+# A match runs from the first number on a line to the line end, so each matching line is counted once
+PAGE_NUMBER_LINE_PATTERN = re.compile(r"\b\d+\b[^\n]*")
+ASCII_DIGITS = "0123456789"
+BACK_MATTER_KEYWORDS = ("index", "bibliography", "references")
+BACK_MATTER_KEYWORD_PATTERN = re.compile(r"\b(" + "|".join(BACK_MATTER_KEYWORDS) + r")\b")
 
-def detect_toc(page_text: str) -> bool:
+
+def _early_reject_max_numbers() -> int:
+    """Largest number_of_page_numbers a page without "contents" or back matter keywords can have and still be rejected whatever its roman numerals, -1 disables the early reject"""
+    # The log likelihood ratio of a Poisson count is linear in the count, so the posterior is monotonic in it and the first accepted count bounds the rejected ones.
+    # The search is capped, if no count up to the cap is accepted (e.g. equal lambdas) the rejected range cannot be bounded this way
+    for number_of_page_numbers in range(LOG_FACTORIAL_TABLE_SIZE):
+        for has_roman_numerals in (False, True):
+            if predict((False, has_roman_numerals, False), (number_of_page_numbers,), LOG_PRIOR_TOC, LOG1M_PRIOR_TOC, BINARY_LIKELIHOODS, NUMERICAL_DISTRIBUTIONS) > TOC_DETECTION_THRESHOLD:
+                return number_of_page_numbers - 1
+    return -1
+
+_EARLY_REJECT_MAX_NUMS = _early_reject_max_numbers() # Derived from the model at import, most pages fall below it and skip predict
+
+
+@functools.lru_cache(maxsize=TOC_DETECTION_CACHE_SIZE)
+def extract_features(page_text: str) -> tuple[bool, bool, int, bool]:
+    """Returns has_keyword_contents, has_roman_numerals, number_of_page_numbers and has_word_index_reference_bibliography_keywords"""
     has_keyword_contents = "contents" in page_text.lower()
-    has_roman_numerals = any(
-        re.search(r"\b[ivxlcdm]+\b", line) for line in page_text.split("\n")
-    )
-    number_of_page_numbers = sum(
-        1 for line in page_text.split("\n") if re.search(r"\b\d+\b", line)
-    )
-    has_word_index_reference_bibliography_keywords = any(
-        re.search(r"\b(index|bibliography|references)\b", line) for line in page_text.split("\n")
+    # Neither pattern can span a newline, so one search over the whole page matches any line
+    has_roman_numerals = ROMAN_NUMERAL_PATTERN.search(page_text) is not None
+    # Lines holding a number, counted in one scan of the page instead of splitting it into a list of lines
+    # An ASCII page without 0-9 cannot match \d, the substring checks rule it out far faster than the regex scan
+    if page_text.isascii() and not any(digit in page_text for digit in ASCII_DIGITS):
+        number_of_page_numbers = 0
+    else:
+        number_of_page_numbers = len(PAGE_NUMBER_LINE_PATTERN.findall(page_text))
+    # The pattern can only match where a keyword occurs as a substring, the substring checks reject most pages without starting the regex
+    has_word_index_reference_bibliography_keywords = (
+        any(keyword in page_text for keyword in BACK_MATTER_KEYWORDS) and BACK_MATTER_KEYWORD_PATTERN.search(page_text) is not None
     )
+    return has_keyword_contents, has_roman_numerals, number_of_page_numbers, has_word_index_reference_bibliography_keywords
+
+
+def detect_toc(page_text: str) -> bool:
+    has_keyword_contents, has_roman_numerals, number_of_page_numbers, has_word_index_reference_bibliography_keywords = extract_features(page_text)
+    if not has_keyword_contents and not has_word_index_reference_bibliography_keywords and number_of_page_numbers <= _EARLY_REJECT_MAX_NUMS:
+        return False
 
-    features = {
-        "binary_features": {
-            "has_keyword_contents": has_keyword_contents,
-            "has_roman_numerals": has_roman_numerals,
-            "has_word_index_reference_bibliography_keywords": has_word_index_reference_bibliography_keywords,
-        },
-        "numerical_features": {"number_of_page_numbers": number_of_page_numbers},
-    }
+    # Ordered as BINARY_LIKELIHOODS.names and NUMERICAL_DISTRIBUTIONS.names
+    binary_observations = (has_keyword_contents, has_roman_numerals, has_word_index_reference_bibliography_keywords)
+    numerical_values = (number_of_page_numbers,)
     return (
-        predict(features["binary_features"], features["numerical_features"], PRIOR_TOC, BINARY_LIKELIHOODS, NUMERICAL_DISTRIBUTIONS)
+        predict(binary_observations, numerical_values, LOG_PRIOR_TOC, LOG1M_PRIOR_TOC, BINARY_LIKELIHOODS, NUMERICAL_DISTRIBUTIONS)
         > TOC_DETECTION_THRESHOLD
     )  # threshold for TOC detection
 
 
+
+def detect_toc_batch(page_texts: list[str]) -> np.ndarray:
+    """detect_toc over many pages at once, features are stacked into (N, feature) arrays and scored with one predict_batch call"""
+    features = [extract_features(page_text) for page_text in page_texts]
+    # Ordered as BINARY_LIKELIHOODS.names and NUMERICAL_DISTRIBUTIONS.names
+    binary_observations = np.array(
+        [(has_keyword_contents, has_roman_numerals, has_keywords) for has_keyword_contents, has_roman_numerals, _, has_keywords in features], dtype=np.bool_
+    ).reshape(-1, len(BINARY_LIKELIHOODS.names))
+    numerical_values = np.array([number_of_page_numbers for _, _, number_of_page_numbers, _ in features], dtype=np.int64).reshape(-1, len(NUMERICAL_DISTRIBUTIONS.names))
+    return predict_batch(binary_observations, numerical_values, LOG_PRIOR_TOC, LOG1M_PRIOR_TOC, BINARY_LIKELIHOODS, NUMERICAL_DISTRIBUTIONS) > TOC_DETECTION_THRESHOLD
+
 if __name__ == "__main__":
+    # Feature order: has_keyword_contents, has_roman_numerals, has_word_index_reference_bibliography_keywords; number_of_page_numbers
     test_samples = [
-        {
-            "binary_features": {
-                "has_keyword_contents": True,
-                "has_roman_numerals": True,
-                "has_word_index_reference_bibliography_keywords": True,
-            },
-            "numerical_features": {"number_of_page_numbers": 10},
-        },
-        {
-            "binary_features": {
-                "has_keyword_contents": False,
-                "has_roman_numerals": True,
-                "has_word_index_reference_bibliography_keywords": True,
-            },
-            "numerical_features": {"number_of_page_numbers": 10},
-        },
-        {
-            "binary_features": {
-                "has_keyword_contents": True,
-                "has_roman_numerals": False,
-                "has_word_index_reference_bibliography_keywords": True,
-            },
-            "numerical_features": {"number_of_page_numbers": 10},
-        },
-        {
-            "binary_features": {
-                "has_keyword_contents": False,
-                "has_roman_numerals": True,
-                "has_word_index_reference_bibliography_keywords": False,
-            },
-            "numerical_features": {"number_of_page_numbers": 10},
-        },
+        ([True, True, True], [10]),
+        ([False, True, True], [10]),
+        ([True, False, True], [10]),
+        ([False, True, False], [10]),
     ]
-    for sample in test_samples:
-        print(f"Sample: {sample}")
-        print(f"Probability of TOC: {predict(sample['binary_features'], sample['numerical_features'], PRIOR_TOC, BINARY_LIKELIHOODS, NUMERICAL_DISTRIBUTIONS)}")
+    for binary_features, numerical_features in test_samples:
+        print(f"Sample: {dict(zip(BINARY_LIKELIHOODS.names, binary_features))}, {dict(zip(NUMERICAL_DISTRIBUTIONS.names, numerical_features))}")
+        print(f"Probability of TOC: {predict(binary_features, numerical_features, LOG_PRIOR_TOC, LOG1M_PRIOR_TOC, BINARY_LIKELIHOODS, NUMERICAL_DISTRIBUTIONS)}")